@@ -1,23 +1,47 @@
-import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+from pymongo.errors import DuplicateKeyError
+
+from utils.CommandListPublisher import CommandListPublisher
+from utils.CommandListView import CommandListPages, CommandListView
+from utils.MediaStorage import MediaStorageError
 
 CUSTOM_COMMANDS_CHANNEL_ID = 812144663279566899
+# How often the in-memory registry is reloaded to pick up edits made directly in the database
+CUSTOM_COMMANDS_REFRESH_MINUTES = 60
+SEARCH_RESULTS = 20
 
 
 class CustomCommandsCog(commands.Cog):
     def __init__(self, bot):
         print("Registering Custom Commands Cog")
         self.bot = bot
-        self.collection = self.bot.custom_commands_collection
-        self.publitio_api = bot.publitio_api
+        self.media_storage = bot.media_storage
+        self.list_pages = CommandListPages(bot.custom_commands)
+        self.list_publisher = CommandListPublisher(bot, CUSTOM_COMMANDS_CHANNEL_ID, bot.command_lists_collection)
+        self.refresh_custom_commands.start()
+        # Catch the lists up with anything changed while the bot was offline, a no-op when nothing was
+        self.list_publisher.schedule()
+
+    def cog_unload(self):
+        self.refresh_custom_commands.cancel()
+        self.list_publisher.close()
+
+    @tasks.loop(minutes=CUSTOM_COMMANDS_REFRESH_MINUTES)
+    async def refresh_custom_commands(self):
+        # The registry is loaded in setup_hook, skip the immediate first iteration
+        if self.refresh_custom_commands.current_loop == 0:
+            return
+        await self.bot.custom_commands.load()
+        self.list_publisher.schedule()
 
-    async def upload_image(self, file):
-        response = self.publitio_api.create_file(file=file)
-        return response
+    async def upload_image(self, attachment):
+        return await self.media_storage.upload(attachment.url, attachment.filename, attachment.content_type)
 
     async def delete_image(self, file_id):
-        response = self.publitio_api.delete_file(file_id)
-        return response
+        try:
+            await self.media_storage.delete(file_id)
+        except MediaStorageError as e:
+            print(f'Failed to delete image {file_id}: {e}')
 
     # Create a group command for custom commands
     @commands.group()
@@ -27,54 +51,12 @@ class CustomCommandsCog(commands.Cog):
             await ctx.send("Tsk.")
             return
 
-    async def post_new_lists(self):
-        channel = self.bot.get_channel(CUSTOM_COMMANDS_CHANNEL_ID)
-        commands_list = await self.collection.find({}).to_list(length=None)
-
-        async def image_list():
-
-            list_string = ""
-            for command in commands_list:
-                if len(list_string) > 1500:
-                    embed = discord.Embed()
-                    embed.title = "Image Commands"
-                    embed.description = list_string
-                    await channel.send(embed=embed)
-                    list_string = ""
-                if 'image_url' in command:
-                    list_string += f"[howler {command['name']}]({command['image_url']})\n"
-
-            embed = discord.Embed()
-            embed.title = "Image Commands"
-            embed.description = list_string
-            await channel.send(embed=embed)
-
-        async def text_list():
-            list_string = ""
-            for command in commands_list:
-                if len(list_string) > 1500:
-                    embed = discord.Embed()
-                    embed.title = "Text Commands"
-                    embed.description = list_string
-                    await channel.send(embed=embed)
-                    list_string = ""
-                if 'text_response' in command:
-                    list_string += f"howler {command['name']}\n"
-
-            embed = discord.Embed()
-            embed.title = "Text Commands"
-            embed.description = list_string
-            await channel.send(embed=embed)
-
-        await image_list()
-        await text_list()
-
     # Create a command to register new custom commands
     @custom.command()
     @commands.has_any_role('Commander', 'Discord Admin', 'Rick Tocchet Stan')
     async def add(self, ctx, response_type, command_name, *, text=None):
-        # Check if the command name is already taken
-        if await self.collection.find_one({'name': command_name}):
+        # Check if the command name is already taken, before anything gets uploaded
+        if command_name in self.bot.custom_commands:
             await ctx.send(f"The custom command '{command_name}' is already taken.")
             return
 
@@ -88,82 +70,69 @@ class CustomCommandsCog(commands.Cog):
             await ctx.send(f"An image attachment is required for an image command.")
             return
 
-        channel = self.bot.get_channel(CUSTOM_COMMANDS_CHANNEL_ID)
         if response_type.lower() == 'image':
-            file = await ctx.message.attachments[0].read()
-            response = await self.upload_image(file)
-            # Save the command name and image URL to the database
-            await self.collection.insert_one({'name': command_name, 'user': str(ctx.author), 'image_url': response['url_preview'], 'publitio_id': response['id']})
-            await ctx.send(f"The custom command '{command_name}' has been registered with an image.")
+            try:
+                response = await self.upload_image(ctx.message.attachments[0])
+            except MediaStorageError as e:
+                print(e)
+                await ctx.send("Couldn't upload that image, try again in a bit.")
+                return
+            # Save the command name and image URL to the database. publitio_id holds whichever storage id
+            # the image was saved under, the name is kept so existing documents still line up.
+            command = {'name': command_name, 'user': str(ctx.author), 'image_url': response['url'], 'publitio_id': response['id']}
         else:
             if text is None:
                 await ctx.send("Text custom commands can't have an empty message. Add a message.")
                 return
-            text_response = text
             # Save the command name and text response to the database
-            await self.collection.insert_one({'name': command_name, 'user': str(ctx.author), 'text_response': text_response})
+            command = {'name': command_name, 'user': str(ctx.author), 'text_response': text}
+
+        try:
+            await self.bot.custom_commands.insert(command)
+        except DuplicateKeyError:
+            # Someone else took the name while the image was uploading
+            if 'publitio_id' in command:
+                await self.delete_image(command['publitio_id'])
+            await ctx.send(f"The custom command '{command_name}' is already taken.")
+            return
+
+        if 'image_url' in command:
+            await ctx.send(f"The custom command '{command_name}' has been registered with an image.")
+        else:
             await ctx.send(f"The custom command '{command_name}' has been registered with a text response.")
 
-        await channel.purge(limit=100, check=self.bot.is_me)
-        await self.post_new_lists()
+        self.list_publisher.schedule()
 
     # Create a command to un register custom commands
     @custom.command()
     @commands.has_any_role('Commander', 'Discord Admin', 'Rick Tocchet Stan')
     async def remove(self, ctx, command_name):
-        command = await self.collection.find_one({'name': command_name})
+        command = await self.bot.custom_commands.delete(command_name)
         if command:
-            await self.collection.delete_many({'name': command_name})
             if 'image_url' in command:
                 await self.delete_image(command['publitio_id'])
             await ctx.send(f"The custom command '{command_name}' has been deleted.")
-            channel = self.bot.get_channel(CUSTOM_COMMANDS_CHANNEL_ID)
-            await channel.purge(limit=100, check=self.bot.is_me)
-            await self.post_new_lists()
+            self.list_publisher.schedule()
         else:
             await ctx.send(f"The custom command '{command_name}' doesn't exist.")
 
     @commands.command()
     async def image(self, ctx, category):
         if category == "list":
-            commands_list = await self.collection.find({}).to_list(length=None)
-
-            list_string = ""
-            for command in commands_list:
-                if len(list_string) > 1500:
-                    embed = discord.Embed()
-                    embed.title = "Image Commands"
-                    embed.description = list_string
-                    await ctx.send(embed=embed)
-                    list_string = ""
-                if 'image_url' in command:
-                    list_string += f"[howler {command['name']}]({command['image_url']})\n"
-
-            embed = discord.Embed()
-            embed.title = "Image Commands"
-            embed.description = list_string
-            await ctx.send(embed=embed)
+            await CommandListView(self.list_pages, 'image', ctx.author.id).send(ctx)
 
     @commands.command()
     async def text(self, ctx, category):
         if category == "list":
-            commands_list = await self.collection.find({}).to_list(length=None)
-
-            list_string = ""
-            for command in commands_list:
-                if len(list_string) > 1500:
-                    embed = discord.Embed()
-                    embed.title = "Text Commands"
-                    embed.description = list_string
-                    await ctx.send(embed=embed)
-                    list_string = ""
-                if 'text_response' in command:
-                    list_string += f"howler {command['name']}\n"
-
-            embed = discord.Embed()
-            embed.title = "Text Commands"
-            embed.description = list_string
-            await ctx.send(embed=embed)
+            await CommandListView(self.list_pages, 'text', ctx.author.id).send(ctx)
+
+    @commands.command(brief="Lists the custom commands starting with some text.")
+    async def search(self, ctx, prefix):
+        names = self.bot.custom_commands.complete(prefix, SEARCH_RESULTS)
+        if not names:
+            await ctx.send(f"No custom commands start with '{prefix}'.")
+            return
+        await ctx.send('\n'.join(f'howler {name}' for name in names))
 
 
 async def setup(bot):
@@ -1,4 +1,6 @@
 import asyncio
+import gzip
+import hashlib
 
 import aiohttp_cors
 from aiohttp import web
@@ -9,6 +11,12 @@ import aiohttp
 from bson import json_util
 import json
 
+from cogs.TriviaCommands import ALLTIME_SORT, ALLTIME_STATS, QUESTION_STATS
+from utils.CustomCommandRegistry import TYPE_PROJECTIONS
+
+# Most rows the trivia stats routes return in one response
+TRIVIA_API_LIMIT = 100
+
 app = web.Application()
 routes = web.RouteTableDef()
 
@@ -17,6 +25,43 @@ def rgb2hex(r, g, b):
     return "#{:02x}{:02x}{:02x}".format(r, g, b)
 
 
+# A response body serialized and compressed once, served until the data behind it changes
+class CachedBody:
+    __slots__ = ('version', 'etag', 'gzip_etag', 'body', 'gzip_body')
+
+    def __init__(self, version, data):
+        self.version = version
+        self.body = json_util.dumps(data).encode()
+        self.gzip_body = gzip.compress(self.body)
+        digest = hashlib.sha1(self.body).hexdigest()
+        # The compressed body is a different representation, so it gets its own strong tag
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+
+def etag_matches(if_none_match, cached):
+    if if_none_match is None:
+        return False
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return '*' in tags or cached.etag in tags or cached.gzip_etag in tags
+
+
+def cached_response(request, cached):
+    # no-cache lets clients keep the body but has them check the tag before using it
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        headers['ETag'] = cached.gzip_etag
+        headers['Content-Encoding'] = 'gzip'
+        body = cached.gzip_body
+    else:
+        headers['ETag'] = cached.etag
+        body = cached.body
+
+    if etag_matches(request.headers.get('If-None-Match'), cached):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type='application/json', headers=headers)
+
+
 async def setup(bot):
     await bot.add_cog(Webserver(bot))
 
@@ -26,29 +71,38 @@ class Webserver(commands.Cog):
         self.site = None
         print("Registering HowlerAPI Cog")
         self.bot = bot
-        self.custom_commands_collection = bot.custom_commands_collection
+        self.command_bodies = {}
         self.web_server.start()
 
         @routes.get('/api/image_commands')
         async def get_image_commands(request):
-            print('called')
-            commands_list = await self.custom_commands_collection.find().to_list(length=None)
-            image_commands = []
-            for command in commands_list:
-                if 'image_url' in command:
-                    image_commands.append(command)
-
-            return web.json_response(json.loads(json_util.dumps(image_commands)))
+            return cached_response(request, self.command_list_body('image'))
 
         @routes.get('/api/text_commands')
         async def get_text_commands(request):
-            commands_list = await self.custom_commands_collection.find().to_list(length=None)
-            text_commands = []
-            for command in commands_list:
-                if 'text_response' in command:
-                    text_commands.append(command)
+            return cached_response(request, self.command_list_body('text'))
+
+        @routes.get('/api/trivia/alltime')
+        async def get_trivia_alltime(request):
+            users = await self.bot.trivia_database[ALLTIME_STATS].find() \
+                .sort(ALLTIME_SORT) \
+                .limit(TRIVIA_API_LIMIT) \
+                .to_list(length=TRIVIA_API_LIMIT)
 
-            return web.json_response(json.loads(json_util.dumps(text_commands)))
+            return web.json_response(json.loads(json_util.dumps(users)))
+
+        @routes.get('/api/trivia/questions')
+        async def get_trivia_questions(request):
+            query = {}
+            if 'season' in request.rel_url.query:
+                query['season'] = request.rel_url.query['season']
+
+            questions = await self.bot.trivia_database[QUESTION_STATS].find(query, {'_id': 0}) \
+                .sort('ended_at', -1) \
+                .limit(TRIVIA_API_LIMIT) \
+                .to_list(length=TRIVIA_API_LIMIT)
+
+            return web.json_response(json.loads(json_util.dumps(questions)))
 
         @routes.get('/api/utils/roles')
         async def get_valid_roles_from_roles(request):
@@ -85,6 +139,18 @@ class Webserver(commands.Cog):
         for route in list(app.router.routes()):
             cors.add(route)
 
+    def command_list_body(self, type_name):
+        # Built from the in-memory registry, only when a command has been added or removed since the last one
+        custom_commands = self.bot.custom_commands
+        cached = self.command_bodies.get(type_name)
+        if cached is None or cached.version != custom_commands.version:
+            fields = ['_id', *TYPE_PROJECTIONS[type_name]]
+            data = [{field: command[field] for field in fields if field in command}
+                    for command in custom_commands.by_type(type_name)]
+            cached = CachedBody(custom_commands.version, data)
+            self.command_bodies[type_name] = cached
+        return cached
+
     def __unload(self):
         asyncio.ensure_future(self.site.stop())
 
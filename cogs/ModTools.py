@@ -12,6 +12,23 @@ class ModTools(commands.Cog):
         channel = self.bot.get_channel(1104121223409045647)
         await channel.send(member.mention)
 
+    @commands.command(brief="Shows HTTP connection reuse and caching per host.")
+    @commands.has_any_role('Commander', 'Discord Admin')
+    async def httpstats(self, ctx):
+        stats_string = "```\n"
+        for host, stats in self.bot.http_client.stats.items():
+            new, reused = stats['new_connections'], stats['reused_connections']
+            reuse_rate = reused / (new + reused) * 100 if new + reused else 0
+            stats_string += f"{host}\n  {stats['requests']} requests, {new} new, {reused} reused ({reuse_rate:.0f}%)\n"
+            stats_string += f"  {stats['cache_hits']} served from cache, {stats['not_modified']} not modified\n"
+        stats_string += "```"
+
+        embed = discord.Embed(
+            title="HTTP Connections",
+            description=stats_string
+        )
+        await ctx.send(embed=embed)
+
 
 async def setup(bot):
     await bot.add_cog(ModTools(bot))
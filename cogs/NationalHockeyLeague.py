@@ -1,12 +1,17 @@
+import asyncio
 import os
 
 import discord
 from discord.ext import tasks, commands
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
+import codecs
+from html.parser import HTMLParser
+
 import pytz
-import aiohttp
 from iso8601 import iso8601
-from bs4 import BeautifulSoup
+
+from utils.FinalGameCache import FinalGameCache
+from utils.WriteBehindDocument import WriteBehindDocument
 
 EST = pytz.timezone('US/Eastern')
 UTC = pytz.timezone('UTC')
@@ -20,19 +25,57 @@ else:
     CHANNEL_ID = 798968918692724736
     DATABASE_RECORD = "1"
 
-HIGHLIGHT_VIDEO_URL = 'https://players.brightcove.net/6415718365001/EXtG1xJ7H_default/index.html?videoId'
+# Followed in CHANNEL_ID until someone sets up subscriptions
+DEFAULT_TEAM = 'ARI'
 
+# game_loop sleeps until shortly before puck drop, then polls at a rate that depends on the game state
+PREGAME_LEAD = timedelta(minutes=5)
+PREGAME_POLL_SECONDS = 60
+LIVE_POLL_SECONDS = 15
+IDLE_POLL_SECONDS = 60 * 60
+# Give up on a game that never reported a final state, e.g. postponed games
+STALE_GAME = timedelta(hours=12)
 
-async def fetch(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            return await response.json()
+PREVIEW_CHUNK_SIZE = 16 * 1024
 
+HIGHLIGHT_VIDEO_URL = 'https://players.brightcove.net/6415718365001/EXtG1xJ7H_default/index.html?videoId'
 
-async def fetch_html(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            return await response.read()
+# Team abbreviation -> the team's section on nhl.com, where its game previews are posted
+TEAM_NEWS_PAGES = {
+    'ANA': 'ducks',
+    'ARI': 'coyotes',
+    'BOS': 'bruins',
+    'BUF': 'sabres',
+    'CGY': 'flames',
+    'CAR': 'canes',
+    'CHI': 'blackhawks',
+    'COL': 'avalanche',
+    'CBJ': 'bluejackets',
+    'DAL': 'stars',
+    'DET': 'redwings',
+    'EDM': 'oilers',
+    'FLA': 'panthers',
+    'LAK': 'kings',
+    'MIN': 'wild',
+    'MTL': 'canadiens',
+    'NSH': 'predators',
+    'NJD': 'devils',
+    'NYI': 'islanders',
+    'NYR': 'rangers',
+    'OTT': 'senators',
+    'PHI': 'flyers',
+    'PIT': 'penguins',
+    'SJS': 'sharks',
+    'SEA': 'kraken',
+    'STL': 'blues',
+    'TBL': 'lightning',
+    'TOR': 'mapleleafs',
+    'UTA': 'utah',
+    'VAN': 'canucks',
+    'VGK': 'goldenknights',
+    'WSH': 'capitals',
+    'WPG': 'jets',
+}
 
 
 def default(dictionary):
@@ -64,27 +107,209 @@ def shotType(goal):
     return ''
 
 
+def poll_interval(game):
+    # Before puck drop, and after the final horn while we wait on the three stars
+    if game['gameState'] in ('FUT', 'PRE', 'FINAL', 'OFF'):
+        return PREGAME_POLL_SECONDS
+
+    clock = game.get('clock', {})
+    if clock.get('inIntermission'):
+        # Nothing happens during an intermission, check back shortly before play resumes
+        return max(clock.get('secondsRemaining', 0) - 2 * LIVE_POLL_SECONDS, LIVE_POLL_SECONDS)
+
+    return LIVE_POLL_SECONDS
+
+
+# Only cares about anchor hrefs, remembers the first one containing the needle
+class PreviewLinkParser(HTMLParser):
+    def __init__(self, needle):
+        super().__init__()
+        self.needle = needle
+        self.link = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a' or self.link is not None:
+            return
+        for name, value in attrs:
+            if name == 'href' and value and self.needle in value:
+                self.link = value
+                return
+
+
+def find_game_id(games, team):
+    for game in games:
+        if game['homeTeam']['abbrev'] == team or game['awayTeam']['abbrev'] == team:
+            return game['id']
+    return 0
+
+
+def goal_key(goal):
+    # Stable id for a goal across polls, used as its field name in the goals document
+    if 'eventId' in goal:
+        return f'event-{goal["eventId"]}'
+    return f'{goal["period"]}-{goal["timeInPeriod"]}-{goal.get("playerId")}'
+
+
+def diff_goals(previous, current):
+    added = [goal for key, goal in current.items() if key not in previous]
+    removed = [goal for key, goal in previous.items() if key not in current]
+    changed = [goal for key, goal in current.items() if key in previous and previous[key] != goal]
+    return added, removed, changed
+
+
+# A game involving at least one followed team. Polled on its own schedule by game_loop.
+class TrackedGame:
+    def __init__(self, game_id, game_time, home_team, away_team, goals=None, previews_posted=(), finished=False):
+        self.game_id = game_id
+        self.game_time = game_time
+        self.home_team = home_team
+        self.away_team = away_team
+        self.goals = goals or {}
+        self.previews_posted = set(previews_posted)
+        self.finished = finished
+        self.next_poll = game_time - PREGAME_LEAD
+
+    @property
+    def teams(self):
+        return self.home_team, self.away_team
+
+    def to_document(self):
+        return {
+            'gameTime': self.game_time.isoformat(),
+            'homeTeam': self.home_team,
+            'awayTeam': self.away_team,
+            'goals': self.goals,
+            'previews_posted': list(self.previews_posted),
+            'finished': self.finished
+        }
+
+    @classmethod
+    def from_document(cls, game_id, document):
+        return cls(game_id, iso8601.parse_date(document['gameTime']), document['homeTeam'], document['awayTeam'],
+                   document['goals'], document['previews_posted'], document['finished'])
+
+
+# Today's tracked games, kept in memory and written behind to the game tracker record.
+# Loaded once when the cog loads, which is also how a restart picks up where it left off.
+class GameTrackerState:
+    def __init__(self, collection):
+        self.document = WriteBehindDocument(collection, DATABASE_RECORD)
+        self.games = {}
+
+    async def load(self):
+        db_values = await self.document.load()
+        if db_values is None or 'games' not in db_values:
+            # Older records tracked a single game in top level fields, start over in the new shape
+            self.document.unset(['gameTime', 'game_id', 'goals', 'preview_posted'])
+            self.document.set({'games': {}})
+            return
+
+        self.games = {int(game_id): TrackedGame.from_document(int(game_id), document)
+                      for game_id, document in db_values['games'].items()}
+
+    async def close(self):
+        await self.document.close()
+
+    def reset(self):
+        self.games = {}
+        self.document.set({'games': {}})
+
+    def add_game(self, tracked):
+        self.games[tracked.game_id] = tracked
+        self.document.set({f'games.{tracked.game_id}': tracked.to_document()})
+
+    def update_goals(self, tracked, goals, added, removed, changed):
+        tracked.goals = goals
+        prefix = f'games.{tracked.game_id}.goals'
+        self.document.set({f'{prefix}.{goal_key(goal)}': goal for goal in added + changed})
+        self.document.unset(f'{prefix}.{goal_key(goal)}' for goal in removed)
+
+    def finish_game(self, tracked):
+        tracked.finished = True
+        self.document.set({f'games.{tracked.game_id}.finished': True})
+
+    def mark_preview_posted(self, tracked, team):
+        tracked.previews_posted.add(team)
+        self.document.set({f'games.{tracked.game_id}.previews_posted': list(tracked.previews_posted)})
+
+
+# Marker document in the subscriptions collection, there once the default team has been followed
+SUBSCRIPTIONS_SEEDED = 'seeded'
+
+
+# Which channels follow which teams, mirrored in memory from the subscriptions collection
+class Subscriptions:
+    def __init__(self, collection):
+        self.collection = collection
+        self.channels = {}
+
+    async def load(self):
+        documents = await self.collection.find({}).to_list(length=None)
+        subscriptions = [document for document in documents if document['_id'] != SUBSCRIPTIONS_SEEDED]
+
+        if len(subscriptions) == len(documents):
+            if not documents:
+                # Start out following the team this bot was built for
+                await self.add(DEFAULT_TEAM, CHANNEL_ID)
+            # Only ever seeded once, unfollowing every team shouldn't bring the default back on a restart
+            await self.collection.update_one({"_id": SUBSCRIPTIONS_SEEDED}, {"$set": {'seeded': True}}, upsert=True)
+
+        for document in subscriptions:
+            self.channels.setdefault(document['team'], set()).add(document['channel_id'])
+
+    async def add(self, team, channel_id):
+        await self.collection.update_one({"_id": f'{channel_id}-{team}'}, {"$set": {
+            'team': team,
+            'channel_id': channel_id
+        }}, upsert=True)
+        self.channels.setdefault(team, set()).add(channel_id)
+
+    async def remove(self, team, channel_id):
+        await self.collection.delete_one({"_id": f'{channel_id}-{team}'})
+        self.channels.get(team, set()).discard(channel_id)
+
+    def channels_for(self, *teams):
+        channel_ids = set()
+        for team in teams:
+            channel_ids |= self.channels.get(team, set())
+        return channel_ids
+
+    def teams_for(self, channel_id):
+        return sorted(team for team, channel_ids in self.channels.items() if channel_id in channel_ids)
+
+
 class NationalHockeyLeague(commands.Cog):
     def __init__(self, bot):
         print("Registering National Hockey League Cog")
         self.bot = bot
+        self.http_client = bot.http_client
+        self.final_games = FinalGameCache(self.http_client)
         self.game_tracker = bot.game_tracker_database['game_tracker']
-        self.game_time = None
+        self.state = GameTrackerState(self.game_tracker)
+        self.subscriptions = Subscriptions(bot.game_tracker_database['subscriptions'])
+        # news page url -> the day we last read it, see find_preview
+        self.previews_checked = {}
+
+    async def cog_load(self):
+        await self.state.load()
+        await self.subscriptions.load()
         self.game_loop.start()
-        self.game_id = None
-        self.goals = []
-        self.are_we_home = False
-        self.preview_posted = False
         self.morning_loop.start()
         self.preview_loop.start()
 
-    async def generate_schedule_embed(self, team, enemy, game):
-        game_time = iso8601.parse_date(game['startTimeUTC']).replace(tzinfo=UTC).astimezone(EST)
-        game_id = game['id']
-        await self.game_tracker.update_one({"_id": DATABASE_RECORD}, {"$set": {
-            "gameTime": game_time.isoformat(),
-            "game_id": game_id
-        }})
+    async def cog_unload(self):
+        self.game_loop.cancel()
+        self.morning_loop.cancel()
+        self.preview_loop.cancel()
+        await self.state.close()
+
+    async def send(self, channel_ids, *args, **kwargs):
+        for channel_id in channel_ids:
+            channel = self.bot.get_channel(channel_id)
+            if channel is not None:
+                await channel.send(*args, **kwargs)
+
+    async def generate_schedule_embed(self, enemy, game, channel_ids):
         enemyName = enemy["placeName"]["default"]
         embed = discord.Embed(
             title="It's Game Day!!!",
@@ -93,31 +318,27 @@ class NationalHockeyLeague(commands.Cog):
         )
         embed.set_image(url="https://media.publit.io/file/fil-pmn.gif")
 
-        channel = self.bot.get_channel(CHANNEL_ID)
-        await channel.send(embed=embed)
-
-    def isNowInTimePeriod(self, startTime, endTime, nowTime):
-        if startTime < endTime:
-            return startTime <= nowTime <= endTime
-        else:  # Over midnight
-            return nowTime >= startTime or nowTime <= endTime
+        await self.send(channel_ids, embed=embed)
 
     async def post_game(self):
         today = datetime.now(EST).strftime('%Y-%m-%d')
-        response = await fetch(f'https://api-web.nhle.com/v1/schedule/{today}')
+        response = await self.http_client.get_json(f'https://api-web.nhle.com/v1/schedule/{today}', cache=True)
         todaysGames = response['gameWeek'][0]['games']
         for game in todaysGames:
             awayTeam = game['awayTeam']
             homeTeam = game['homeTeam']
+            followed = [team for team in (homeTeam, awayTeam) if self.subscriptions.channels_for(team['abbrev'])]
+            if not followed:
+                continue
 
-            if homeTeam['abbrev'] == 'ARI' or homeTeam['abbrev'] == 'PHX':
-                self.are_we_home = True
-                await self.generate_schedule_embed(homeTeam, awayTeam, game)
-            elif awayTeam['abbrev'] == 'ARI' or homeTeam['abbrev'] == 'PHX':
-                self.are_we_home = False
-                await self.generate_schedule_embed(awayTeam, homeTeam, game)
+            game_time = iso8601.parse_date(game['startTimeUTC']).replace(tzinfo=UTC).astimezone(EST)
+            self.state.add_game(TrackedGame(game['id'], game_time, homeTeam['abbrev'], awayTeam['abbrev']))
 
-    async def post_goal(self, goal, homeAbbrev, awayAbbrev):
+            for team in followed:
+                enemy = awayTeam if team is homeTeam else homeTeam
+                await self.generate_schedule_embed(enemy, game, self.subscriptions.channels_for(team['abbrev']))
+
+    async def post_goal(self, goal, homeAbbrev, awayAbbrev, channel_ids):
         assistString = ''
         if len(goal['assists']) == 1:
             assistString += f'{default(goal["assists"][0]["name"])} ({goal["assists"][0]["assistsToDate"]})'
@@ -142,156 +363,177 @@ class NationalHockeyLeague(commands.Cog):
         embed.set_footer(text=footer)
         embed.set_thumbnail(url=goal['headshot'])
 
-        channel = self.bot.get_channel(CHANNEL_ID)
-        await channel.send(embed=embed)
-
-    async def reset_db_values(self):
-        await self.game_tracker.update_one({"_id": DATABASE_RECORD}, {"$set": {
-            'gameTime': None,
-            'game_id': 0,
-            'goals': [],
-            'preview_posted': False
-        }})
-
-    async def retrieve_db_values(self):
-        db_values = await self.game_tracker.find_one({"_id": DATABASE_RECORD})
-        if db_values['gameTime'] is None or db_values['gameTime'] == '':
-            self.game_time = None
-        else:
-            gameTime = iso8601.parse_date(db_values['gameTime'])
-            self.game_time = gameTime
-
-        self.game_id = db_values['game_id']
-        self.goals = db_values['goals']
-        self.preview_posted = db_values['preview_posted']
+        await self.send(channel_ids, embed=embed)
 
     @tasks.loop(time=time(hour=15))
     async def morning_loop(self):
-        await self.reset_db_values()
+        self.state.reset()
         await self.post_game()
+        # Wake game_loop up from its idle sleep so it can schedule itself around today's games
+        self.game_loop.restart()
+
+    async def find_preview(self, url, today):
+        parser = PreviewLinkParser(today)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        # An unchanged page can't have gained a preview since we last read it, as long as that was today
+        conditional = self.previews_checked.get(url) == today
+        self.previews_checked[url] = today
+
+        async with self.http_client.stream(url, conditional=conditional) as response:
+            if response is None:
+                return None
+            async for chunk in response.content.iter_chunked(PREVIEW_CHUNK_SIZE):
+                parser.feed(decoder.decode(chunk))
+                if parser.link is not None:
+                    break
+
+        return parser.link
 
     @tasks.loop(minutes=30)
     async def preview_loop(self):
-        await self.retrieve_db_values()
-        if self.game_time is None or self.preview_posted == True:
-            return
-        else:
-            response = await fetch_html('https://www.nhl.com/coyotes/news/')
-            today = datetime.now(EST).strftime('%m%d%y')
-            html = BeautifulSoup(response, "html.parser")
-            profiles = []
-            for profile in html.findAll('a'):
-                profile = profile.get('href')
-                profiles.append(profile)
-
-            for profile in profiles:
-                if profile and str(today) in profile:
-                    channel = self.bot.get_channel(CHANNEL_ID)
-                    await channel.send(f'https://www.nhl.com' + profile)
-                    await self.game_tracker.update_one({"_id": DATABASE_RECORD}, {"$set": {
-                        "preview_posted": True
-                    }})
-                    return
-
-    @tasks.loop(seconds=30)
+        today = datetime.now(EST).strftime('%m%d%y')
+        for tracked in list(self.state.games.values()):
+            for team in tracked.teams:
+                if team in tracked.previews_posted or team not in TEAM_NEWS_PAGES:
+                    continue
+                channel_ids = self.subscriptions.channels_for(team)
+                if not channel_ids:
+                    continue
+
+                link = await self.find_preview(f'https://www.nhl.com/{TEAM_NEWS_PAGES[team]}/news/', today)
+                if link is not None:
+                    await self.send(channel_ids, f'https://www.nhl.com' + link)
+                    self.state.mark_preview_posted(tracked, team)
+
+    @tasks.loop(seconds=IDLE_POLL_SECONDS)
     async def game_loop(self):
-        if self.game_loop.current_loop % 10 == 0:
-            print(f'Game Loop iteration: ' + str(self.game_loop.current_loop))
+        now = datetime.now(tz=EST)
+        due = []
+        for tracked in list(self.state.games.values()):
+            if tracked.finished:
+                continue
+            if now > tracked.game_time + STALE_GAME:
+                self.state.finish_game(tracked)
+                continue
+            if now >= tracked.next_poll:
+                due.append(tracked)
+
+        # Each live game is fetched once no matter how many channels follow it
+        results = await asyncio.gather(*(self.poll_game(tracked) for tracked in due), return_exceptions=True)
+        for tracked, result in zip(due, results):
+            if isinstance(result, Exception):
+                print(f'Failed to poll game {tracked.game_id}: {result!r}')
+
+        next_polls = [tracked.next_poll for tracked in self.state.games.values() if not tracked.finished]
+        if next_polls:
+            self.game_loop.change_interval(seconds=max((min(next_polls) - datetime.now(tz=EST)).total_seconds(), 1))
+        else:
+            self.game_loop.change_interval(seconds=IDLE_POLL_SECONDS)
 
-        currentDay = datetime.now().day
-        currentMonth = datetime.now().month
-        currentYear = datetime.now().year
-        nineAM = datetime(currentYear, currentMonth, currentDay, hour=9, minute=0, second=0, tzinfo=EST)
+    async def poll_game(self, tracked):
+        # Don't hammer the API if this poll fails part way through
+        tracked.next_poll = datetime.now(tz=EST) + timedelta(seconds=LIVE_POLL_SECONDS)
 
-        await self.retrieve_db_values()
+        game = await self.http_client.get_json(f'https://api-web.nhle.com/v1/gamecenter/{tracked.game_id}/landing', cache=True)
+        tracked.next_poll = datetime.now(tz=EST) + timedelta(seconds=poll_interval(game))
+        homeTeam = game['homeTeam']['abbrev']
+        awayTeam = game['awayTeam']['abbrev']
+        channel_ids = self.subscriptions.channels_for(homeTeam, awayTeam)
 
-        if self.game_time is None:
+        if 'summary' not in game:
             return
 
-        if self.isNowInTimePeriod(self.game_time, nineAM, datetime.now(tz=EST)):
-            print('Inside the game loop now')
-            game = await fetch(f'https://api-web.nhle.com/v1/gamecenter/{self.game_id}/landing')
-            check_goals = []
-            homeTeam = game['homeTeam']['abbrev']
-            awayTeam = game['awayTeam']['abbrev']
-
-            if 'summary' not in game:
-                return
+        if 'scoring' not in game['summary']:
+            return
 
-            if 'scoring' not in game['summary']:
+        goals = {}
+        for period in game['summary']['scoring']:
+            if 'goals' not in period:
+                continue
+            for goal in period['goals']:
+                goal = dict(goal, period=period['periodDescriptor']['number'])
+                goals[goal_key(goal)] = goal
+
+        added, removed, changed = diff_goals(tracked.goals, goals)
+
+        for goal in added:
+            await self.post_goal(goal, homeAbbrev=homeTeam, awayAbbrev=awayTeam, channel_ids=channel_ids)
+        for goal in removed:
+            print(f'Goal removed: {default(goal["name"])} at {goal["timeInPeriod"]} of period {goal["period"]}')
+        for goal in changed:
+            print(f'Goal changed: {default(goal["name"])} at {goal["timeInPeriod"]} of period {goal["period"]}')
+
+        if added or removed or changed:
+            self.state.update_goals(tracked, goals, added, removed, changed)
+
+        if game['gameState'] in ('FINAL', 'OFF'):
+            threeStars = game["summary"].get("threeStars", [])
+            # A FINAL game can still be waiting on its stars, once it's OFF nothing else is coming
+            if len(threeStars) != 3 and game['gameState'] == 'FINAL':
                 return
 
-            for period in game['summary']['scoring']:
-                if 'goals' not in period:
-                    continue
-                for goal in period['goals']:
-                    goal["period"] = period['periodDescriptor']['number']
-                    check_goals.append(goal)
-
-            if len(check_goals) > len(self.goals):
-                self.goals = check_goals
-                await self.post_goal(self.goals[-1], homeAbbrev=homeTeam, awayAbbrev=awayTeam)
-                await self.game_tracker.update_one({"_id": DATABASE_RECORD}, {"$set": {
-                    "goals": self.goals
-                }})
-
-            if len(check_goals) < len(self.goals):
-                self.goals = check_goals
-                await self.game_tracker.update_one({"_id": DATABASE_RECORD}, {"$set": {
-                    "goals": self.goals
-                }})
-
-            if game['gameState'] == 'FINAL':
-                if len(game["summary"]["threeStars"]) != 3:
-                    return
-
-                threeStars = game["summary"]["threeStars"]
-
+            if len(threeStars) == 3:
                 embed = discord.Embed(
                     title='Three Stars of the Game'
                 )
                 embed.add_field(name="⭐", value=f'{threeStars[0]["name"]}', inline=False)
                 embed.add_field(name="⭐⭐", value=f'{threeStars[1]["name"]}', inline=False)
                 embed.add_field(name="⭐⭐⭐", value=f'{threeStars[2]["name"]}', inline=False)
-                channel = self.bot.get_channel(CHANNEL_ID)
-                await channel.send(embed=embed)
+                await self.send(channel_ids, embed=embed)
 
-                await self.game_tracker.update_one({"_id": DATABASE_RECORD}, {"$set": {
-                    "goals": [],
-                    "game_id": 0,
-                }})
+            self.state.finish_game(tracked)
 
     @game_loop.before_loop
     async def before_game_loop(self):
         print('waiting...')
         await self.bot.wait_until_ready()
 
+    @commands.group(brief="NHL game tracker commands")
+    async def nhl(self, ctx):
+        if not ctx.invoked_subcommand:
+            await ctx.send(
+                "This is a group command, use `howler help nhl` to get list of subcommands under this command.")
+            return
+
+    @nhl.command(brief="Follows a team's games in this channel.")
+    @commands.has_any_role('Commander', 'Discord Admin')
+    async def follow(self, ctx, team):
+        team = team.upper()
+        if team not in TEAM_NEWS_PAGES:
+            await ctx.send(f"I don't know a team called '{team}', use the team's abbreviation like ARI.")
+            return
+
+        await self.subscriptions.add(team, ctx.channel.id)
+        await ctx.send(f"This channel is now following {team}. Game days are picked up each morning.")
+
+    @nhl.command(brief="Stops following a team's games in this channel.")
+    @commands.has_any_role('Commander', 'Discord Admin')
+    async def unfollow(self, ctx, team):
+        team = team.upper()
+        await self.subscriptions.remove(team, ctx.channel.id)
+        await ctx.send(f"This channel is no longer following {team}.")
+
+    @nhl.command(brief="Lists the teams followed in this channel.")
+    async def following(self, ctx):
+        teams = self.subscriptions.teams_for(ctx.channel.id)
+        if not teams:
+            await ctx.send("This channel isn't following any teams.")
+            return
+        await ctx.send(f"This channel is following {', '.join(teams)}.")
+
     @commands.command()
-    async def goals(self, ctx, year: int, month: int, day: int):
+    async def goals(self, ctx, year: int, month: int, day: int, team=DEFAULT_TEAM):
         date = datetime(year=year, month=month, day=day).strftime('%Y-%m-%d')
-        url = f'https://api-web.nhle.com/v1/schedule/{date}'
-        print(url)
-        response = await fetch(url)
+        today = datetime.now(EST).strftime('%Y-%m-%d')
+        response = await self.final_games.schedule(date, today)
         days_games = response['gameWeek'][0]['games']
-        highlight_game_id = 0
-        for game in days_games:
-            awayTeam = game['awayTeam']
-            homeTeam = game['homeTeam']
-
-            if homeTeam['abbrev'] == 'ARI' or homeTeam['abbrev'] == 'PHX':
-                highlight_game_id = game['id']
-                break
-            elif awayTeam['abbrev'] == 'ARI' or homeTeam['abbrev'] == 'PHX':
-                highlight_game_id = game['id']
-                break
+        highlight_game_id = find_game_id(days_games, team.upper())
 
         if highlight_game_id == 0:
-            ctx.send('No arizona games that day')
+            await ctx.send(f'No {team.upper()} games that day')
             return
 
-        url = f'https://api-web.nhle.com/v1/gamecenter/{highlight_game_id}/landing'
-        print(url)
-        game = await fetch(url)
+        game = await self.final_games.landing(highlight_game_id, date, today)
 
         highlights_string = ''
 
@@ -334,31 +576,18 @@ class NationalHockeyLeague(commands.Cog):
         await ctx.send('oopsie didnt find anything blame bert')
 
     @commands.command()
-    async def recap(self, ctx, year: int, month: int, day: int):
+    async def recap(self, ctx, year: int, month: int, day: int, team=DEFAULT_TEAM):
         date = datetime(year=year, month=month, day=day).strftime('%Y-%m-%d')
-        url = f'https://api-web.nhle.com/v1/schedule/{date}'
-        print(url)
-        response = await fetch(url)
+        today = datetime.now(EST).strftime('%Y-%m-%d')
+        response = await self.final_games.schedule(date, today)
         days_games = response['gameWeek'][0]['games']
-        highlight_game_id = 0
-        for game in days_games:
-            awayTeam = game['awayTeam']
-            homeTeam = game['homeTeam']
-
-            if homeTeam['abbrev'] == 'ARI' or homeTeam['abbrev'] == 'PHX':
-                highlight_game_id = game['id']
-                break
-            elif awayTeam['abbrev'] == 'ARI' or homeTeam['abbrev'] == 'PHX':
-                highlight_game_id = game['id']
-                break
+        highlight_game_id = find_game_id(days_games, team.upper())
 
         if highlight_game_id == 0:
-            await ctx.send('No arizona games that day')
+            await ctx.send(f'No {team.upper()} games that day')
             return
 
-        url = f'https://api-web.nhle.com/v1/gamecenter/{highlight_game_id}/landing'
-        print(url)
-        game = await fetch(url)
+        game = await self.final_games.landing(highlight_game_id, date, today)
 
         highlights_string = ''
 
@@ -379,5 +608,7 @@ class NationalHockeyLeague(commands.Cog):
             return
 
         await ctx.send('oopsie didnt find anything blame bert')
+
+
 async def setup(bot):
     await bot.add_cog(NationalHockeyLeague(bot))
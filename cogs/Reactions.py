@@ -34,12 +34,13 @@ class Reactions(commands.Cog, name="Reactions"):
 
     @tasks.loop(count=1)
     async def get_all_reaction_events(self):
-        self.bot.reaction_events.clear()
         collection = await self.reaction_events_collection.find({}).to_list(length=None)
+        events = []
         for document in collection:
             x = ReactionEvent(document["_id"], document['text'], document['type'], document['reaction'],
                               document['reaction_name'])
-            self.bot.reaction_events.append(x)
+            events.append(x)
+        self.bot.reaction_events.load(events)
 
     @commands.group(brief="Reaction Event Group Commands")
     async def reactionevent(self, ctx):
@@ -63,7 +64,7 @@ class Reactions(commands.Cog, name="Reactions"):
 
             await self.reaction_events_collection.insert_one(reaction_event_dict)
             x = ReactionEvent(event_id, text, "built-in", reaction, None)
-            self.bot.reaction_events.append(x)
+            self.bot.reaction_events.add(x)
 
         else:
             if not reaction.is_usable():
@@ -79,13 +80,27 @@ class Reactions(commands.Cog, name="Reactions"):
                                    "reaction_name": reaction.name}
             await self.reaction_events_collection.insert_one(reaction_event_dict)
             x = ReactionEvent(event_id, text, "custom", reaction.id, reaction.name)
-            self.bot.reaction_events.append(x)
+            self.bot.reaction_events.add(x)
 
     @has_custom_commands_role()
     @reactionevent.command(brief="Removes a reaction event.")
     async def remove(self, ctx, event_id: int):
         await self.reaction_events_collection.delete_many({"_id": event_id})
-        self.get_all_reaction_events.start()
+        self.bot.reaction_events.remove(event_id)
+
+    @has_custom_commands_role()
+    @reactionevent.command(brief="Changes the text of a reaction event.")
+    async def edit(self, ctx, event_id: int, *, text):
+        reaction_event = self.bot.reaction_events.get(event_id)
+        if reaction_event is None:
+            await ctx.send("That event id doesn't exist!")
+            return
+
+        text = text.lower()
+
+        await self.reaction_events_collection.update_one({"_id": event_id}, {"$set": {"text": text}})
+        x = ReactionEvent(event_id, text, reaction_event.type, reaction_event.reaction, reaction_event.reaction_name)
+        self.bot.reaction_events.update(x)
 
     @reactionevent.command(brief="Lists all reaction events.")
     async def list(self, ctx):
@@ -108,6 +123,9 @@ class Reactions(commands.Cog, name="Reactions"):
             title="Reaction Events",
             description=list_string
         )
+        reaction_events = self.bot.reaction_events
+        embed.set_footer(text=f"{len(reaction_events)} events, version {reaction_events.version}, "
+                              f"rebuilt in {reaction_events.last_rebuild_seconds * 1000:.2f}ms")
 
         await ctx.send(embed=embed)
 
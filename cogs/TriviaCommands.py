@@ -1,8 +1,11 @@
+import asyncio
 import os
+from datetime import datetime, timezone
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from dotenv import load_dotenv
+from pymongo import UpdateMany, UpdateOne
 
 load_dotenv()
 TEST_ENVIRONMENT = os.getenv('HOWLER_TESTING_ENVIRONMENT') == 'true'
@@ -15,39 +18,102 @@ else:
     TRIVIA_ROLE = 851886327808655431
 
 
-async def add_user(member, user_collection):
-    if await user_collection.count_documents({"_id": str(member.id)}, limit=1) != 0:
-        return
+ANSWER_EMOJIS = {
+    "🇦": 1,
+    "🇧": 2,
+    "🇨": 3,
+    "🇩": 4
+}
+# How often buffered answers are written to the season collection
+ANSWER_FLUSH_SECONDS = 2
+
+LEADERBOARD_PAGE_SIZE = 10
+# Collections in the trivia database that hold the cross season rollups
+ALLTIME_STATS = 'alltime_stats'
+QUESTION_STATS = 'question_stats'
+# Ties are broken by name, highest first, the same order the leaderboard has always used
+LEADERBOARD_SORT = [('number_correct', -1), ('display_name', -1)]
+ALLTIME_SORT = [('points', -1), ('display_name', -1)]
+
+
+def member_display_name(member):
     name = member.display_name
     if len(member.display_name) > 21 and len(member.name) <= 21:
         name = member.name
     elif len(member.display_name) > 21 and len(member.name) > 21:
         name = member.display_name[0:21]
+    return name
+
 
-    user_dict = {"_id": str(member.id), 'answer': 0, 'number_correct': 0, 'display_name': name}
-    await user_collection.insert_one(user_dict)
+# The running trivia question, mirrored in memory from the server_info document
+class TriviaQuestion:
+    def __init__(self, message_id, current_season, correct_answer):
+        self.message_id = message_id
+        self.current_season = current_season
+        self.correct_answer = correct_answer
 
 
-async def update_answer(user, answer, user_collection):
-    await user_collection.update_one({"_id": str(user.id)}, {"$set": {'answer': answer}})
+def answer_values(correct_answer):
+    # Answers are stored as ints but the correct answer comes in as text, match either
+    values = [str(correct_answer)]
+    if str(correct_answer).isdigit():
+        values.append(int(correct_answer))
+    return values
 
 
 async def give_points(name_list, user_collection, correct_answer):
-    users = user_collection.find()
-    ans_correctly = 0
-    ans_total = 0
-    for user in await users.to_list(length=None):
-        user_id, answer, points, name = user['_id'], user['answer'], user['number_correct'], user['display_name']
-        if str(answer) == str(correct_answer):
-            ans_correctly += 1
-            await user_collection.update_one({"_id": str(user_id)}, {"$set": {'number_correct': points + 1}})
-            name_list.append(name)
-            ans_total += 1
-        elif answer != 0:
-            ans_total += 1
-        await user_collection.update_one({"_id": str(user_id)}, {"$set": {'answer': 0}})
-
-    return {"total": ans_total, "correct": ans_correctly}
+    correct_values = answer_values(correct_answer)
+    answered_correctly = {'answer': {'$in': correct_values}}
+    answered = {'answer': {'$ne': 0}}
+
+    answered_users = await user_collection.find(answered, {'display_name': 1, 'answer': 1}).to_list(length=None)
+    correct_users = [user for user in answered_users if user['answer'] in correct_values]
+    for user in correct_users:
+        name_list.append(user['display_name'])
+
+    await user_collection.bulk_write([
+        UpdateMany(answered_correctly, {'$inc': {'number_correct': 1}}),
+        UpdateMany(answered, {'$set': {'answer': 0}})
+    ], ordered=True)
+
+    return {"total": len(answered_users), "correct": len(correct_users), "answered_users": answered_users,
+            "correct_ids": {user['_id'] for user in correct_users}}
+
+
+def alltime_update(name, season, correct):
+    # Pipeline update so the streaks can be worked out from the stored values in the same round trip
+    counted = {'$add': [{'$ifNull': ['$points', 0]}, 1 if correct else 0]}
+    streak = {'$add': [{'$ifNull': ['$current_streak', 0]}, 1]} if correct else 0
+    return [
+        {'$set': {
+            'display_name': {'$literal': name},
+            'points': counted,
+            'answered': {'$add': [{'$ifNull': ['$answered', 0]}, 1]},
+            'current_streak': streak,
+            'seasons': {'$setUnion': [{'$ifNull': ['$seasons', []]}, [{'$literal': season}]]}
+        }},
+        {'$set': {'best_streak': {'$max': [{'$ifNull': ['$best_streak', 0]}, '$current_streak']}}}
+    ]
+
+
+async def record_question_stats(trivia_database, season, correct_answer, ratio_dict):
+    # Roll the question into the all time totals as it ends, so the stats never have to rescan old seasons
+    answered_users = ratio_dict['answered_users']
+    if answered_users:
+        await trivia_database[ALLTIME_STATS].bulk_write([
+            UpdateOne({"_id": user['_id']},
+                      alltime_update(user['display_name'], season, user['_id'] in ratio_dict['correct_ids']),
+                      upsert=True)
+            for user in answered_users
+        ], ordered=False)
+
+    await trivia_database[QUESTION_STATS].insert_one({
+        'season': season,
+        'correct_answer': str(correct_answer),
+        'answered': ratio_dict['total'],
+        'correct': ratio_dict['correct'],
+        'ended_at': datetime.now(timezone.utc)
+    })
 
 
 class TriviaBot(commands.Cog, name="Trivia"):
@@ -55,36 +121,83 @@ class TriviaBot(commands.Cog, name="Trivia"):
         print("Registering Trivia Cog")
         self.bot = bot
         self.server_info = bot.trivia_database['server_info']
+        self.question = None
+        # user id -> (display name, answer) waiting to be written
+        self.pending_answers = {}
+        self.flush_lock = asyncio.Lock()
+        # season -> {page: rendered leaderboard}, dropped whenever the season's points change
+        self.leaderboards = {}
+        self.indexed_seasons = set()
+
+    async def cog_load(self):
+        server_info = await self.server_info.find_one()
+        self.question = TriviaQuestion(server_info['message_id'], server_info['current_season'],
+                                       server_info.get('correct_answer'))
+        self.flush_answers.start()
+
+    async def cog_unload(self):
+        # Stopped rather than cancelled, so a write in flight either lands or puts its batch back
+        self.flush_answers.stop()
+        task = self.flush_answers.get_task()
+        if task is not None:
+            await task
+        async with self.flush_lock:
+            await self.save_pending_answers()
+
+    @tasks.loop(seconds=ANSWER_FLUSH_SECONDS)
+    async def flush_answers(self):
+        # Held for the whole write, so end and cancel wait for one already in flight
+        async with self.flush_lock:
+            if not self.pending_answers:
+                return
+
+            pending, self.pending_answers = self.pending_answers, {}
+            try:
+                await self.write_answers(pending)
+            except Exception as e:
+                print(f'Failed to save trivia answers, retrying: {e}')
+                # Keep any answer changed since this batch was taken
+                self.pending_answers = {**pending, **self.pending_answers}
+
+    # For end and startseason, which hold flush_lock and can't go on until every answer is saved
+    async def save_pending_answers(self):
+        pending, self.pending_answers = self.pending_answers, {}
+        if not pending:
+            return True
+        try:
+            await self.write_answers(pending)
+        except Exception as e:
+            print(f'Failed to save trivia answers: {e}')
+            self.pending_answers = {**pending, **self.pending_answers}
+            return False
+        return True
+
+    async def write_answers(self, pending):
+        season_user_collection = self.bot.trivia_database[self.question.current_season]
+        await season_user_collection.bulk_write([
+            UpdateOne({"_id": str(user_id)}, {
+                "$set": {'answer': answer},
+                "$setOnInsert": {'number_correct': 0, 'display_name': name}
+            }, upsert=True)
+            for user_id, (name, answer) in pending.items()
+        ], ordered=False)
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        server_info_collection = self.bot.trivia_database['server_info']
-        trivia_question = await server_info_collection.find_one()
-        current_season = trivia_question['current_season']
-        season_user_collection = self.bot.trivia_database[current_season]
-        msg = await self.bot.get_channel(payload.channel_id).fetch_message(payload.message_id)
-        payload_message_id = payload.message_id
-        question = await server_info_collection.find_one()
-        target_message_id = question['message_id']
-
-        if payload_message_id == target_message_id:
-            if msg.author.id != payload.user_id:
-                user = payload.member
-                await msg.remove_reaction(payload.emoji, user)
-
-                if payload.emoji.name == "🇦":
-                    answer = 1
-                elif payload.emoji.name == '🇧':
-                    answer = 2
-                elif payload.emoji.name == '🇨':
-                    answer = 3
-                elif payload.emoji.name == '🇩':
-                    answer = 4
-                else:
-                    return
+        # Every reaction in the server comes through here, bail out without any I/O unless it's on the question
+        if self.question is None or payload.message_id != self.question.message_id:
+            return
+        if payload.user_id == self.bot.user.id:
+            return
+
+        message = self.bot.get_channel(payload.channel_id).get_partial_message(payload.message_id)
+        await message.remove_reaction(payload.emoji, payload.member)
+
+        answer = ANSWER_EMOJIS.get(payload.emoji.name)
+        if answer is None:
+            return
 
-                await add_user(user, season_user_collection)
-                await update_answer(user, answer, season_user_collection)
+        self.pending_answers[payload.user_id] = (member_display_name(payload.member), answer)
 
     @commands.group(brief="Trivia Group Commands", invoke_without_command=True)
     async def trivia(self, ctx):
@@ -96,10 +209,7 @@ class TriviaBot(commands.Cog, name="Trivia"):
     @trivia.command()
     @commands.has_role('trivia master')
     async def setup(self, ctx, correct_answer, url):
-        server_info_collection = self.bot.trivia_database['server_info']
-        trivia_question = await server_info_collection.find_one()
-        question_id = trivia_question['message_id']
-        if question_id != 0:
+        if self.question.message_id != 0:
             await ctx.send('There is already a trivia message running, end it before starting a new one!')
             return
 
@@ -116,44 +226,56 @@ class TriviaBot(commands.Cog, name="Trivia"):
         )
         embed.set_image(url=str(url))
         trivia_message = await channel.send(embed=embed)
-        await server_info_collection.update_one({"_id": 1}, {"$set": {'message_id': trivia_message.id}})
+        self.question.message_id = trivia_message.id
+        self.question.correct_answer = correct_answer
+        await self.server_info.update_one({"_id": 1}, {"$set": {
+            'message_id': trivia_message.id,
+            'correct_answer': correct_answer
+        }})
         await trivia_message.add_reaction('\U0001F1E6')
         await trivia_message.add_reaction('\U0001F1E7')
         await trivia_message.add_reaction('\U0001F1E8')
         await trivia_message.add_reaction('\U0001F1E9')
 
-        server_info_collection.update_one({"_id": 1}, {"$set": {'correct_answer': correct_answer}})
-
         await ctx.message.delete()
 
     @trivia.command(name="cancel", brief="Cancels the trivia question",
                     description="Cancels the current trivia question without awarding points")
     @commands.has_role('trivia master')
     async def _trivia_cancel(self, ctx):
-        server_info_collection = self.bot.trivia_database['server_info']
-        server_info = await server_info_collection.find_one()
-        season_user_collection = self.bot.trivia_database[str(server_info['current_season'])]
+        season_user_collection = self.bot.trivia_database[str(self.question.current_season)]
 
-        question_id = server_info['message_id']
+        question_id = self.question.message_id
+        self.question.message_id = 0
 
         channel = self.bot.get_channel(TRIVIA_CHANNEL)
 
-        msg = await channel.fetch_message(question_id)
-        await msg.delete()
+        await channel.get_partial_message(question_id).delete()
 
-        await season_user_collection.update_many({'i': {'$gt': 0}}, {'$set': {'answer': 0}})
-        await server_info_collection.update_one({"_id": 1}, {'$set': {'message_id': 0}})
+        # Under the lock so an answer flush in flight can't land after the reset, or put its batch back after it
+        async with self.flush_lock:
+            self.pending_answers.clear()
+            await season_user_collection.update_many({'answer': {'$ne': 0}}, {'$set': {'answer': 0}})
+        await self.server_info.update_one({"_id": 1}, {'$set': {'message_id': 0}})
         await ctx.send('Canceling the current trivia question. No points awarded')
 
     @trivia.command()
     @commands.has_role('trivia master')
     async def end(self, ctx):
-        server_info_collection = self.bot.trivia_database['server_info']
-        server_info = await server_info_collection.find_one()
-        current_season = server_info['current_season']
-        correct_answer = server_info['correct_answer']
+        current_season = self.question.current_season
+        correct_answer = self.question.correct_answer
         season_user_collection = self.bot.trivia_database[current_season]
 
+        # Stop taking answers and get the buffered ones in before scoring
+        question_id = self.question.message_id
+        self.question.message_id = 0
+        async with self.flush_lock:
+            if not await self.save_pending_answers():
+                # Reopen the question with the answers still buffered rather than score without them
+                self.question.message_id = question_id
+                await ctx.send("Couldn't save the last answers, try ending the question again in a bit.")
+                return
+
         await ctx.send('Ending the current trivia question!')
 
         role = ctx.guild.get_role(TRIVIA_ROLE)
@@ -166,6 +288,8 @@ class TriviaBot(commands.Cog, name="Trivia"):
 
         name_list = []
         ratio_dict = await give_points(name_list, season_user_collection, correct_answer)
+        self.leaderboards.pop(current_season, None)
+        await record_question_stats(self.bot.trivia_database, current_season, correct_answer, ratio_dict)
         ratio_string = f"{ratio_dict['correct']}/{ratio_dict['total']} answered correctly"
         names_string = "```\n"
 
@@ -175,69 +299,172 @@ class TriviaBot(commands.Cog, name="Trivia"):
         names_string += "```"
         embed.description = names_string
         embed.set_footer(text=ratio_string)
-        await server_info_collection.update_one({"_id": 1}, {"$set": {'message_id': 0}})
+        await self.server_info.update_one({"_id": 1}, {"$set": {'message_id': 0}})
         await ctx.send(embed=embed)
 
     @trivia.command()
     @commands.has_role('trivia master')
     async def startseason(self, ctx, *, season):
-        server_info_collection = self.bot.trivia_database['server_info']
-        await server_info_collection.update_one({"_id": 1}, {"$set": {'current_season': str(season)}})
+        # Answers buffered so far belong to the old season
+        async with self.flush_lock:
+            if not await self.save_pending_answers():
+                await ctx.send("Couldn't save the last answers, try starting the season again in a bit.")
+                return
+            self.question.current_season = str(season)
+        await self.server_info.update_one({"_id": 1}, {"$set": {'current_season': str(season)}})
         await ctx.send('Starting a new season!')
 
     @trivia.command()
     async def leaderboard(self, ctx, *, season=""):
         if season == "":
-            x = await self.server_info.find_one()
-            current_season = x['current_season']
-            print(current_season)
+            current_season = self.question.current_season
         else:
             current_season = season
 
         await self.leaderboard_setup(ctx, current_season)
 
-    async def leaderboard_setup(self, ctx, season):
+    @trivia.command(brief="Shows a page of the trivia leaderboard.")
+    async def page(self, ctx, page: int, *, season=""):
+        if season == "":
+            season = self.question.current_season
+
+        await self.leaderboard_setup(ctx, season, page)
+
+    @trivia.command(brief="Shows where someone is on the trivia leaderboard.")
+    async def rank(self, ctx, member: discord.Member = None):
+        member = member or ctx.author
+        season = self.question.current_season
         season_user_collection = self.bot.trivia_database[str(season)]
+        await self.ensure_leaderboard_index(season, season_user_collection)
 
-        if await season_user_collection.estimated_document_count() == 0:
-            await ctx.send('The leaderboard is empty, complete a trivia question in the season first!')
+        user = await season_user_collection.find_one({"_id": str(member.id)}, {'number_correct': 1})
+        if user is None:
+            await ctx.send(f"{member.display_name} hasn't answered any trivia in {season} yet.")
             return
 
-        user_names = []
-        user_scores = []
+        points = user['number_correct']
+        rank = await season_user_collection.count_documents({'number_correct': {'$gt': points}}) + 1
+        await ctx.send(f"{member.display_name} is ranked #{rank} in {season} with {points} correct.")
 
-        users = await season_user_collection.find().to_list(length=None)
+    @trivia.command(brief="Shows the all time trivia leaderboard.")
+    async def alltime(self, ctx):
+        alltime_stats = self.bot.trivia_database[ALLTIME_STATS]
+        await self.ensure_alltime_index(alltime_stats)
 
-        for user in users:
-            points, name = user['number_correct'], user['display_name']
-            user_names.append(name)
-            user_scores.append(points)
+        users = await alltime_stats.find({}, {'display_name': 1, 'points': 1, 'answered': 1}) \
+            .sort(ALLTIME_SORT) \
+            .limit(LEADERBOARD_PAGE_SIZE) \
+            .to_list(length=LEADERBOARD_PAGE_SIZE)
+
+        if not users:
+            await ctx.send('Nobody has finished a trivia question yet!')
+            return
+
+        leaderboard_string = "```\n"
+        for (index, user) in enumerate(users):
+            accuracy = user['points'] / user['answered'] * 100
+            leaderboard_string += f"{index + 1:<3}{user['display_name']:<23} {user['points']:<4} {accuracy:.0f}%\n"
+        leaderboard_string += "```"
 
         embed = discord.Embed(
-            title=str(season) + " Trivia Leaderboard",
+            title="All Time Trivia Leaderboard",
             color=discord.Colour.blue(),
         )
+        embed.description = leaderboard_string
+        await ctx.send(embed=embed)
 
-        zipped_lists = zip(user_scores, user_names)
-        sorted_pairs = sorted(zipped_lists)
+    @trivia.command(brief="Shows someone's all time trivia stats.")
+    async def stats(self, ctx, member: discord.Member = None):
+        member = member or ctx.author
+        user = await self.bot.trivia_database[ALLTIME_STATS].find_one({"_id": str(member.id)})
+        if user is None:
+            await ctx.send(f"{member.display_name} hasn't answered any trivia yet.")
+            return
 
-        tuples = zip(*sorted_pairs)
-        user_scores, user_names = [list(tuple) for tuple in tuples]
+        embed = discord.Embed(
+            title=f"{user['display_name']}'s Trivia Stats",
+            color=discord.Colour.blue(),
+        )
+        embed.add_field(name="Correct", value=f"{user['points']}/{user['answered']}", inline=True)
+        embed.add_field(name="Accuracy", value=f"{user['points'] / user['answered'] * 100:.0f}%", inline=True)
+        embed.add_field(name="Seasons", value=str(len(user['seasons'])), inline=True)
+        embed.add_field(name="Current Streak", value=str(user['current_streak']), inline=True)
+        embed.add_field(name="Best Streak", value=str(user['best_streak']), inline=True)
+        await ctx.send(embed=embed)
 
-        user_scores.reverse()
-        user_names.reverse()
-        ranks = []
-        for rank in range(len(user_scores)):
-            ranks.append(rank + 1)
+    @trivia.command(brief="Shows how the most recent trivia questions went.")
+    async def history(self, ctx):
+        questions = await self.bot.trivia_database[QUESTION_STATS].find({}, {'_id': 0}) \
+            .sort('ended_at', -1) \
+            .limit(LEADERBOARD_PAGE_SIZE) \
+            .to_list(length=LEADERBOARD_PAGE_SIZE)
 
-        leaderboard_string = "```\n"
+        if not questions:
+            await ctx.send('Nobody has finished a trivia question yet!')
+            return
 
-        for (user, score, rank) in zip(user_names, user_scores, ranks):
-            if rank > 10:
-                break
-            leaderboard_string += f"{rank:<3}{user:<23} {score}\n"
+        history_string = "```\n"
+        for question in questions:
+            accuracy = question['correct'] / question['answered'] * 100 if question['answered'] else 0
+            history_string += f"{question['ended_at']:%Y-%m-%d} {question['season']:<12.12} " \
+                              f"{question['correct']}/{question['answered']} ({accuracy:.0f}%)\n"
+        history_string += "```"
 
-        leaderboard_string += "```"
+        embed = discord.Embed(
+            title="Recent Trivia Questions",
+            color=discord.Colour.blue(),
+        )
+        embed.description = history_string
+        await ctx.send(embed=embed)
+
+    async def ensure_alltime_index(self, alltime_stats):
+        if ALLTIME_STATS in self.indexed_seasons:
+            return
+        await alltime_stats.create_index(ALLTIME_SORT)
+        self.indexed_seasons.add(ALLTIME_STATS)
+
+    async def ensure_leaderboard_index(self, season, season_user_collection):
+        if season in self.indexed_seasons:
+            return
+        await season_user_collection.create_index(LEADERBOARD_SORT)
+        self.indexed_seasons.add(season)
+
+    async def leaderboard_setup(self, ctx, season, page=1):
+        season = str(season)
+        if page < 1:
+            await ctx.send('Pages start at 1!')
+            return
+
+        leaderboard_string = self.leaderboards.get(season, {}).get(page)
+        if leaderboard_string is None:
+            season_user_collection = self.bot.trivia_database[season]
+            await self.ensure_leaderboard_index(season, season_user_collection)
+
+            users = await season_user_collection.find({}, {'number_correct': 1, 'display_name': 1}) \
+                .sort(LEADERBOARD_SORT) \
+                .skip((page - 1) * LEADERBOARD_PAGE_SIZE) \
+                .limit(LEADERBOARD_PAGE_SIZE) \
+                .to_list(length=LEADERBOARD_PAGE_SIZE)
+
+            if not users:
+                if page == 1:
+                    await ctx.send('The leaderboard is empty, complete a trivia question in the season first!')
+                else:
+                    await ctx.send(f"The leaderboard doesn't have a page {page}.")
+                return
+
+            leaderboard_string = "```\n"
+            for (index, user) in enumerate(users):
+                rank = (page - 1) * LEADERBOARD_PAGE_SIZE + index + 1
+                leaderboard_string += f"{rank:<3}{user['display_name']:<23} {user['number_correct']}\n"
+            leaderboard_string += "```"
+
+            self.leaderboards.setdefault(season, {})[page] = leaderboard_string
+
+        embed = discord.Embed(
+            title=season + " Trivia Leaderboard",
+            color=discord.Colour.blue(),
+        )
         embed.description = leaderboard_string
         await ctx.send(embed=embed)
 
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+
+import discord
+
+from utils.CommandListView import LIST_TITLES, command_line, page_embed, paginate_stable
+
+# Changes made within this long of each other are published together
+PUBLISH_DELAY_SECONDS = 10
+STATE_ID = 'command_lists'
+
+
+def page_digest(page):
+    title, description = page
+    return hashlib.sha1(f'{title}\n{description}'.encode()).hexdigest()
+
+
+# Keeps the custom command lists channel in step with the registry. Remembers which message holds which
+# page and where each page starts, and on a change edits only the messages whose page actually changed,
+# sending or deleting messages at the end when the number of pages moves. Page boundaries are kept between
+# publishes, so adding or removing a command doesn't reflow every page after it. Changes are debounced so
+# a burst of edits publishes once.
+class CommandListPublisher:
+    def __init__(self, bot, channel_id, state_collection, delay=PUBLISH_DELAY_SECONDS):
+        self.bot = bot
+        self.channel_id = channel_id
+        self.state_collection = state_collection
+        self.delay = delay
+        # [{'message_id': ..., 'digest': ...}] for each page in the order they appear in the channel
+        self.slots = None
+        # type -> first command name of each page after the first
+        self.starts = {}
+        self.publish_task = None
+        self.lock = asyncio.Lock()
+
+    def schedule(self):
+        if self.publish_task is None or self.publish_task.done():
+            self.publish_task = asyncio.create_task(self._publish_later())
+
+    async def _publish_later(self):
+        await self.bot.wait_until_ready()
+        await asyncio.sleep(self.delay)
+        # Changes made while this publish is running get a publish of their own
+        self.publish_task = None
+        await self.publish()
+
+    def close(self):
+        if self.publish_task is not None:
+            self.publish_task.cancel()
+            self.publish_task = None
+
+    async def publish(self):
+        async with self.lock:
+            # Runs as a background task, anything that escapes here would be lost along with later updates
+            try:
+                await self._publish()
+            except Exception as e:
+                print(f'Failed to publish the custom command lists: {e}')
+
+    async def _publish(self):
+        channel = self.bot.get_channel(self.channel_id)
+        if channel is None:
+            print(f'Custom command lists channel {self.channel_id} not found, not publishing the lists')
+            return
+
+        if self.slots is None:
+            document = await self.state_collection.find_one({"_id": STATE_ID})
+            if document is None:
+                # First run since pages were tracked, clear out the lists posted the old way
+                await channel.purge(limit=100, check=self.bot.is_me)
+                self.slots = []
+            else:
+                self.slots = document['slots']
+                self.starts = document.get('starts', {})
+
+        pages = []
+        starts = {}
+        for type_name, title in LIST_TITLES.items():
+            entries = [(command['name'], command_line(type_name, command))
+                       for command in self.bot.custom_commands.by_type(type_name)]
+            type_pages, starts[type_name] = paginate_stable(entries, self.starts.get(type_name))
+            pages += [(title, page) for page in type_pages]
+
+        slots = list(self.slots)
+        try:
+            try:
+                await self._update_slots(channel, pages, slots)
+            except discord.NotFound:
+                # One of the pages was deleted by hand, post the lists again so they stay in order
+                for slot in slots:
+                    await self._delete(channel, slot)
+                slots.clear()
+                await self._update_slots(channel, pages, slots)
+        finally:
+            if slots != self.slots or starts != self.starts:
+                self.slots = slots
+                self.starts = starts
+                await self.state_collection.update_one({"_id": STATE_ID}, {"$set": {
+                    'slots': slots,
+                    'starts': starts
+                }}, upsert=True)
+
+    async def _update_slots(self, channel, pages, slots):
+        for index, page in enumerate(pages):
+            digest = page_digest(page)
+            if index == len(slots):
+                message = await channel.send(embed=page_embed(*page))
+                slots.append({'message_id': message.id, 'digest': digest})
+            elif slots[index]['digest'] != digest:
+                await channel.get_partial_message(slots[index]['message_id']).edit(embed=page_embed(*page))
+                slots[index] = {'message_id': slots[index]['message_id'], 'digest': digest}
+
+        while len(slots) > len(pages):
+            await self._delete(channel, slots[-1])
+            slots.pop()
+
+    async def _delete(self, channel, slot):
+        try:
+            await channel.get_partial_message(slot['message_id']).delete()
+        except discord.NotFound:
+            pass
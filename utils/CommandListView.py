@@ -0,0 +1,144 @@
+import bisect
+
+import discord
+
+# Roughly where a page is cut, well under Discord's embed description limit
+PAGE_CHARACTERS = 1500
+# Pages that have to be laid out again are only filled this far, leaving room for later additions
+PAGE_FILL_CHARACTERS = 1000
+LIST_TITLES = {'image': "Image Commands", 'text': "Text Commands"}
+VIEW_TIMEOUT_SECONDS = 180
+
+
+def paginate(lines, limit=PAGE_CHARACTERS):
+    pages = []
+    page = []
+    length = 0
+    for line in lines:
+        if page and length + len(line) > limit:
+            pages.append('\n'.join(page))
+            page = []
+            length = 0
+        page.append(line)
+        length += len(line) + 1
+    pages.append('\n'.join(page))
+    return pages
+
+
+def page_length(entries):
+    return sum(len(line) + 1 for key, line in entries) - 1 if entries else 0
+
+
+# Pages with boundaries that stay put between calls, for messages that get edited in place. entries is a
+# sorted list of (key, line), starts the first key of every page but the first from the last call. Lines
+# fall into the page their key sorts into. A page that grows past the limit spills its tail into the next
+# page if that has room, or into a new page after it, and an emptied page is dropped, so a single change
+# normally touches one or two pages. Returns the pages and the starts to pass next time.
+def paginate_stable(entries, starts=None, limit=PAGE_CHARACTERS, fill=PAGE_FILL_CHARACTERS):
+    if starts is None:
+        pages = [[]]
+        for entry in entries:
+            if pages[-1] and page_length(pages[-1] + [entry]) > fill:
+                pages.append([])
+            pages[-1].append(entry)
+    else:
+        pages = [[] for _ in range(len(starts) + 1)]
+        for entry in entries:
+            pages[bisect.bisect_right(starts, entry[0])].append(entry)
+        pages = [page for page in pages if page] or [[]]
+
+    index = 0
+    while index < len(pages):
+        page = pages[index]
+        if page_length(page) > limit:
+            split = len(page)
+            while split > 1 and page_length(page[:split]) > fill:
+                split -= 1
+            spill = page[split:]
+            if index + 1 < len(pages) and page_length(spill + pages[index + 1]) <= limit:
+                pages[index + 1] = spill + pages[index + 1]
+            else:
+                pages.insert(index + 1, spill)
+            pages[index] = page[:split]
+        index += 1
+
+    return ['\n'.join(line for key, line in page) for page in pages], [page[0][0] for page in pages[1:]]
+
+
+def command_line(type_name, command):
+    if type_name == 'image':
+        return f"[howler {command['name']}]({command['image_url']})"
+    return f"howler {command['name']}"
+
+
+def page_embed(title, description, footer=None):
+    embed = discord.Embed()
+    embed.title = title
+    embed.description = description
+    if footer is not None:
+        embed.set_footer(text=footer)
+    return embed
+
+
+# Rendered list pages for each command type, rebuilt only when the registry's version has moved on
+class CommandListPages:
+    def __init__(self, custom_commands):
+        self.custom_commands = custom_commands
+        self.cache = {}
+
+    def get(self, type_name):
+        version, pages = self.cache.get(type_name, (None, None))
+        if version != self.custom_commands.version:
+            version = self.custom_commands.version
+            pages = paginate([command_line(type_name, command) for command in self.custom_commands.by_type(type_name)])
+            self.cache[type_name] = (version, pages)
+        return pages
+
+
+# One list message with buttons to flip through the pages. Pages are looked up on every click,
+# so a list left open picks up commands added since it was sent.
+class CommandListView(discord.ui.View):
+    def __init__(self, pages, type_name, author_id):
+        super().__init__(timeout=VIEW_TIMEOUT_SECONDS)
+        self.pages = pages
+        self.type_name = type_name
+        self.author_id = author_id
+        self.page = 0
+        self.message = None
+
+    def embed(self):
+        pages = self.pages.get(self.type_name)
+        self.page = min(self.page, len(pages) - 1)
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page == len(pages) - 1
+        return page_embed(LIST_TITLES[self.type_name], pages[self.page], f'Page {self.page + 1}/{len(pages)}')
+
+    async def send(self, ctx):
+        embed = self.embed()
+        if len(self.pages.get(self.type_name)) == 1:
+            await ctx.send(embed=embed)
+            self.stop()
+            return
+        self.message = await ctx.send(embed=embed, view=self)
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id == self.author_id:
+            return True
+        # Answer anyway, otherwise Discord tells them the interaction failed
+        await interaction.response.send_message("Only the person who ran the command can turn the pages.",
+                                                ephemeral=True)
+        return False
+
+    async def on_timeout(self):
+        if self.message is not None:
+            await self.message.edit(view=None)
+
+    @discord.ui.button(label='Previous', style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        self.page = max(self.page - 1, 0)
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label='Next', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        self.page += 1
+        await interaction.response.edit_message(embed=self.embed(), view=self)
@@ -0,0 +1,111 @@
+MAX_SUGGESTION_DISTANCE = 2
+# Anything shorter is too close to too many names, and is usually just someone chatting
+MIN_SUGGESTION_LENGTH = 3
+
+
+def suggestion_distance(word):
+    # Edits allowed before a name stops looking like a typo of the word
+    if len(word) <= 4:
+        return 1
+    return min(MAX_SUGGESTION_DISTANCE, len(word) // 2)
+
+
+class _Node:
+    __slots__ = ('children', 'name')
+
+    def __init__(self):
+        self.children = {}
+        # Set when a command name ends at this node
+        self.name = None
+
+
+# Trie over the custom command names, for prefix completion and "did you mean" suggestions.
+# Suggestions walk the trie computing one row of the edit distance table per node, so whole branches
+# are skipped as soon as every name under them is too far from the word.
+class CommandNameTrie:
+    def __init__(self, names=()):
+        self.root = _Node()
+        self.size = 0
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        node = self.root
+        for character in name:
+            node = node.children.setdefault(character, _Node())
+        if node.name is None:
+            self.size += 1
+        node.name = name
+
+    def remove(self, name):
+        path = [self.root]
+        for character in name:
+            node = path[-1].children.get(character)
+            if node is None:
+                return
+            path.append(node)
+        if path[-1].name is None:
+            return
+        path[-1].name = None
+        self.size -= 1
+
+        # Prune the branch back to the last node that's still needed
+        for index in range(len(name), 0, -1):
+            node = path[index]
+            if node.children or node.name is not None:
+                break
+            del path[index - 1].children[name[index - 1]]
+
+    def complete(self, prefix, limit=25):
+        node = self.root
+        for character in prefix:
+            node = node.children.get(character)
+            if node is None:
+                return []
+
+        names = []
+        stack = [node]
+        while stack and len(names) < limit:
+            node = stack.pop()
+            if node.name is not None:
+                names.append(node.name)
+            # Reversed so the smallest child comes off the stack first and names come out sorted
+            stack.extend(node.children[character] for character in sorted(node.children, reverse=True))
+        return names
+
+    def suggest(self, word, limit=3, max_distance=None):
+        if len(word) < MIN_SUGGESTION_LENGTH:
+            return []
+        if max_distance is None:
+            max_distance = suggestion_distance(word)
+
+        matches = []
+        first_row = list(range(len(word) + 1))
+        for character, child in self.root.children.items():
+            self._suggest(child, character, word, first_row, max_distance, matches)
+        matches.sort()
+        return [name for distance, name in matches[:limit]]
+
+    def _suggest(self, node, character, word, previous_row, max_distance, matches):
+        row = [previous_row[0] + 1]
+        for column in range(1, len(word) + 1):
+            row.append(min(row[column - 1] + 1,
+                           previous_row[column] + 1,
+                           previous_row[column - 1] + (word[column - 1] != character)))
+
+        if node.name is not None and row[-1] <= max_distance:
+            matches.append((row[-1], node.name))
+        if min(row) <= max_distance:
+            for next_character, child in node.children.items():
+                self._suggest(child, next_character, word, row, max_distance, matches)
+
+    def __contains__(self, name):
+        node = self.root
+        for character in name:
+            node = node.children.get(character)
+            if node is None:
+                return False
+        return node.name is not None
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,110 @@
+import bisect
+
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from utils.CommandNameTrie import CommandNameTrie
+
+# Fields each type of command needs when it's listed outside the bot
+TYPE_PROJECTIONS = {
+    'image': {'name': 1, 'user': 1, 'image_url': 1},
+    'text': {'name': 1, 'user': 1, 'text_response': 1},
+}
+
+
+def command_type(document):
+    if 'type' in document:
+        return document['type']
+    return 'image' if 'image_url' in document else 'text'
+
+
+# In-memory copy of the custom commands collection keyed by name, loaded once at startup and kept
+# up to date by the custom commands cog so on_message can resolve commands without hitting Mongo.
+# Also keeps the names of each type in sorted order for the lists, and a version that moves on every
+# change so anything rendered from the registry knows when to rebuild. All reads and writes of the
+# collection go through here.
+class CustomCommandRegistry:
+    def __init__(self, collection):
+        self.collection = collection
+        self.commands = {}
+        self.names_by_type = {'image': [], 'text': []}
+        self.names = CommandNameTrie()
+        self.version = 0
+
+    async def ensure_indexes(self):
+        # Commands saved before the type field existed
+        await self.collection.update_many({'type': {'$exists': False}, 'image_url': {'$exists': True}},
+                                          {'$set': {'type': 'image'}})
+        await self.collection.update_many({'type': {'$exists': False}, 'text_response': {'$exists': True}},
+                                          {'$set': {'type': 'text'}})
+        await self.collection.create_index('type')
+        try:
+            await self.collection.create_index('name', unique=True)
+        except (DuplicateKeyError, OperationFailure) as e:
+            print(f'Custom command names are not unique, clean up the duplicates: {e}')
+
+    async def load(self):
+        documents = await self.collection.find({}).to_list(length=None)
+        # Build the new mapping first and swap it in, so lookups never see a half loaded registry
+        commands = {document['name']: document for document in documents}
+        names_by_type = {'image': [], 'text': []}
+        for name in sorted(commands):
+            names_by_type[command_type(commands[name])].append(name)
+
+        self.commands = commands
+        self.names_by_type = names_by_type
+        self.names = CommandNameTrie(commands)
+        self.version += 1
+
+    # Raises DuplicateKeyError if the name is taken, the unique index is what guards against two adds racing
+    async def insert(self, document):
+        document['type'] = command_type(document)
+        await self.collection.insert_one(document)
+        self.add(document)
+
+    async def delete(self, name):
+        document = await self.collection.find_one_and_delete({'name': name})
+        self.remove(name)
+        return document
+
+    def get(self, name):
+        return self.commands.get(name)
+
+    def complete(self, prefix, limit=25):
+        return self.names.complete(prefix, limit)
+
+    def suggest(self, name, limit=3):
+        return self.names.suggest(name, limit)
+
+    def by_type(self, type_name):
+        return [self.commands[name] for name in self.names_by_type[type_name]]
+
+    def add(self, document):
+        self._unindex(document['name'])
+        self.commands[document['name']] = document
+        bisect.insort(self.names_by_type[command_type(document)], document['name'])
+        self.names.add(document['name'])
+        self.version += 1
+
+    def remove(self, name):
+        document = self._unindex(name)
+        if document is not None:
+            del self.commands[name]
+            self.names.remove(name)
+            self.version += 1
+        return document
+
+    def _unindex(self, name):
+        document = self.commands.get(name)
+        if document is not None:
+            names = self.names_by_type[command_type(document)]
+            del names[bisect.bisect_left(names, name)]
+        return document
+
+    def __contains__(self, name):
+        return name in self.commands
+
+    def __len__(self):
+        return len(self.commands)
+
+    def __iter__(self):
+        return iter(list(self.commands.values()))
@@ -0,0 +1,86 @@
+import asyncio
+import gzip
+import json
+import os
+
+from utils.LRUCache import LRUCache
+
+CACHE_DIRECTORY = os.path.join('cache', 'nhl')
+# Games in these states are over and their schedule entry is settled
+FINAL_STATES = ('FINAL', 'OFF')
+
+
+def schedule_is_final(schedule):
+    games = schedule['gameWeek'][0]['games']
+    return all(game.get('gameState') in FINAL_STATES for game in games)
+
+
+def landing_is_final(landing):
+    # A game sits in FINAL for a while before going OFF, and the highlight and recap videos only get attached
+    # around then. Until both have happened the landing page can still change.
+    return landing.get('gameState') == 'OFF' and 'gameVideo' in landing.get('summary', {})
+
+
+# Keeps schedule and gamecenter responses for finished games, which never change, in memory and in gzipped
+# JSON files on disk so looking up an old game doesn't go out to the NHL API at all. Concurrent lookups of
+# something that isn't cached yet share a single request.
+class FinalGameCache:
+    def __init__(self, http_client, directory=CACHE_DIRECTORY, memory_size=128):
+        self.http_client = http_client
+        self.directory = directory
+        self.memory = LRUCache(maxsize=memory_size)
+        self.in_flight = {}
+
+    async def schedule(self, date, today):
+        # Only a day that is already over can be final, a postponed game might still move onto today
+        is_final = schedule_is_final if date < today else (lambda schedule: False)
+        return await self._get(f'schedule-{date}', f'https://api-web.nhle.com/v1/schedule/{date}', is_final)
+
+    async def landing(self, game_id, date, today):
+        is_final = landing_is_final if date < today else (lambda landing: False)
+        return await self._get(f'landing-{game_id}', f'https://api-web.nhle.com/v1/gamecenter/{game_id}/landing',
+                               is_final)
+
+    async def _get(self, key, url, is_final):
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+
+        job = self.in_flight.get(key)
+        if job is None:
+            job = asyncio.ensure_future(self._load(key, url, is_final))
+            self.in_flight[key] = job
+            job.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(job)
+
+    async def _load(self, key, url, is_final):
+        data = await asyncio.to_thread(self._read, key)
+        if data is None:
+            data = await self.http_client.get_json(url, cache=True)
+            if not is_final(data):
+                return data
+            await asyncio.to_thread(self._write, key, data)
+
+        self.memory.put(key, data)
+        return data
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json.gz')
+
+    def _read(self, key):
+        try:
+            with gzip.open(self._path(key), 'rt', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f'Ignoring unreadable cache file for {key}: {e}')
+            return None
+
+    def _write(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a half written entry behind
+        temporary_path = self._path(key) + '.tmp'
+        with gzip.open(temporary_path, 'wt', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(temporary_path, self._path(key))
@@ -0,0 +1,150 @@
+import contextlib
+import hashlib
+import json
+import re
+import time
+from collections import defaultdict
+
+import aiohttp
+from yarl import URL
+
+from utils.LRUCache import LRUCache
+
+# Connections kept open to each host, the NHL API is polled every few seconds during games
+LIMIT_PER_HOST = 10
+KEEPALIVE_SECONDS = 60
+DNS_CACHE_SECONDS = 300
+TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10)
+MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+# What we know about the last response for a url, enough to revalidate it and skip re-parsing it
+class CachedResponse:
+    __slots__ = ('etag', 'last_modified', 'expires', 'digest', 'data')
+
+    def __init__(self, etag, last_modified, expires, digest, data):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+        self.digest = digest
+        self.data = data
+
+
+def freshness(headers):
+    # Seconds the response may be reused without asking the server again, None if it shouldn't be cached
+    cache_control = headers.get('Cache-Control', '').lower()
+    if 'no-store' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return 0
+    match = MAX_AGE.search(cache_control)
+    if match is None:
+        return 0
+    return max(int(match.group(1)) - int(headers.get('Age', 0)), 0)
+
+
+# One aiohttp session shared by the whole bot, so repeat requests to a host reuse pooled keep-alive
+# connections instead of doing a fresh TCP/TLS handshake every time. Owned by the bot and closed on shutdown.
+class HttpClient:
+    def __init__(self):
+        self.session = None
+        self.stats = defaultdict(lambda: {'requests': 0, 'new_connections': 0, 'reused_connections': 0,
+                                          'cache_hits': 0, 'not_modified': 0})
+        self.responses = LRUCache(maxsize=256)
+        # url -> (ETag, Last-Modified) of the last streamed response that was read through
+        self.validators = LRUCache(maxsize=64)
+
+    async def start(self):
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+
+        connector = aiohttp.TCPConnector(limit_per_host=LIMIT_PER_HOST, keepalive_timeout=KEEPALIVE_SECONDS,
+                                         ttl_dns_cache=DNS_CACHE_SECONDS)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=TIMEOUT, trace_configs=[trace_config])
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def _on_request_start(self, session, context, params):
+        context.host = params.url.host
+        self.stats[context.host]['requests'] += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.stats[context.host]['new_connections'] += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.stats[context.host]['reused_connections'] += 1
+
+    async def get_json(self, url, cache=False):
+        if not cache:
+            async with self.session.get(url) as response:
+                return await response.json()
+
+        cached = self.responses.get(url)
+        host = URL(url).host
+        if cached is not None and cached.expires > time.monotonic():
+            self.stats[host]['cache_hits'] += 1
+            return cached.data
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        async with self.session.get(url, headers=headers) as response:
+            max_age = freshness(response.headers)
+
+            if response.status == 304 and cached is not None:
+                self.stats[host]['not_modified'] += 1
+                cached.expires = time.monotonic() + (max_age or 0)
+                return cached.data
+
+            body = await response.read()
+            if response.status != 200:
+                return json.loads(body)
+
+            digest = hashlib.sha1(body).digest()
+            if cached is not None and cached.digest == digest:
+                # Server doesn't do validators but nothing changed, skip parsing it again
+                self.stats[host]['not_modified'] += 1
+                data = cached.data
+            else:
+                data = json.loads(body)
+
+            if max_age is None:
+                self.responses.pop(url)
+            else:
+                self.responses.put(url, CachedResponse(response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                                                       time.monotonic() + max_age, digest, data))
+            return data
+
+    async def get_bytes(self, url):
+        async with self.session.get(url) as response:
+            return await response.read()
+
+    # Yields the response for the caller to read incrementally. With conditional=True the request is made
+    # conditional on the last response that was read without error, and None is yielded if it's unchanged.
+    @contextlib.asynccontextmanager
+    async def stream(self, url, conditional=False):
+        headers = {}
+        etag, last_modified = self.validators.get(url, (None, None))
+        if conditional and etag:
+            headers['If-None-Match'] = etag
+        if conditional and last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 304:
+                self.stats[response.url.host]['not_modified'] += 1
+                yield None
+                return
+
+            yield response
+            # Only reached when the caller finished with the response without raising
+            if response.status == 200:
+                self.validators.put(url, (response.headers.get('ETag'), response.headers.get('Last-Modified')))
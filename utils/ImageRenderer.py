@@ -0,0 +1,264 @@
+import functools
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.LRUCache import LRUCache
+
+SLAP_TEMPLATE = 'slap/batman.jpg'
+SLAP_AVATAR_SIZE = 128, 128
+SLAP_AUTHOR_COORDS = (150, 25)
+SLAP_USER_COORDS = (300, 110)
+
+YEET_FONT = 'arial.ttf'
+YEET_AVATAR_SIZE = 64, 64
+# Frames where the avatar is parked off canvas don't need it pasted at all
+YEET_OFF_CANVAS = (-100, -100)
+
+# Resized avatars keyed by (avatar hash, size), so a regular doesn't get decoded and resized every time
+avatar_thumbnails = LRUCache(maxsize=256)
+# Finished slap images keyed by (author avatar hash, target avatar hash)
+slap_renders = LRUCache(maxsize=64)
+# Finished yeet GIFs keyed by avatar hash, bounded by total size since each GIF is a couple of MB
+yeet_renders = LRUCache(maxsize=64, maxbytes=32 * 1024 * 1024)
+
+
+@functools.lru_cache(maxsize=None)
+def slap_template():
+    template = Image.open(SLAP_TEMPLATE)
+    template.load()
+    return template
+
+
+@functools.lru_cache(maxsize=None)
+def yeet_font():
+    return ImageFont.truetype(YEET_FONT, 50)
+
+
+@functools.lru_cache(maxsize=None)
+def yeet_frame_bank():
+    frames = []
+    for framePath in yeetFrames:
+        frame = Image.open(framePath)
+        frame.load()
+        text = ImageDraw.Draw(frame)
+        text.text((115, 140), "YEET", font=yeet_font())
+        frames.append(frame)
+    return tuple(frames)
+
+
+def preload():
+    slap_template()
+    yeet_frame_bank()
+
+
+def avatar_thumbnail(avatar_key, avatar_bytes, size):
+    key = (avatar_key, size)
+    thumbnail = avatar_thumbnails.get(key)
+    if thumbnail is None:
+        thumbnail = Image.open(BytesIO(avatar_bytes))
+        thumbnail.thumbnail(size, Image.LANCZOS)
+        avatar_thumbnails.put(key, thumbnail)
+    return thumbnail
+
+
+def render_slap(author_key, author_bytes, user_key, user_bytes):
+    slap = slap_template().copy()
+    slap.paste(avatar_thumbnail(author_key, author_bytes, SLAP_AVATAR_SIZE), SLAP_AUTHOR_COORDS)
+    slap.paste(avatar_thumbnail(user_key, user_bytes, SLAP_AVATAR_SIZE), SLAP_USER_COORDS)
+
+    buffer = BytesIO()
+    slap.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_yeet(user_bytes):
+    profilePic = Image.open(BytesIO(user_bytes))
+    profilePic.thumbnail(YEET_AVATAR_SIZE, Image.LANCZOS)
+
+    # Resize the avatar once per distinct size instead of once per frame
+    thumbnails = {}
+    for options in profilePicCoords:
+        if options['size'] not in thumbnails:
+            thumbnail = profilePic.copy()
+            thumbnail.thumbnail(options['size'], Image.LANCZOS)
+            thumbnails[options['size']] = thumbnail
+
+    images = []
+    for frame, options in zip(yeet_frame_bank(), profilePicCoords):
+        if options['coords'] != YEET_OFF_CANVAS:
+            frame = frame.copy()
+            frame.paste(thumbnails[options['size']], options['coords'])
+        images.append(frame)
+
+    buffer = BytesIO()
+    images[0].save(buffer, format='GIF',
+                   save_all=True, append_images=images[1:], optimize=False, duration=80, loop=0)
+    return buffer.getvalue()
+
+
+yeetFrames = [
+    "frames/frame_11_delay-0.1s.jpg",
+    "frames/frame_12_delay-0.1s.jpg",
+    "frames/frame_13_delay-0.1s.jpg",
+    "frames/frame_14_delay-0.1s.jpg",
+    "frames/frame_15_delay-0.1s.jpg",
+    "frames/frame_16_delay-0.1s.jpg",
+    "frames/frame_17_delay-0.1s.jpg",
+    "frames/frame_18_delay-0.1s.jpg",
+    "frames/frame_19_delay-0.1s.jpg",
+    "frames/frame_20_delay-0.1s.jpg",
+    "frames/frame_21_delay-0.1s.jpg",
+    "frames/frame_22_delay-0.1s.jpg",
+    "frames/frame_23_delay-0.1s.jpg",
+    "frames/frame_24_delay-0.1s.jpg",
+    "frames/frame_25_delay-0.1s.jpg",
+    "frames/frame_26_delay-0.1s.jpg",
+    "frames/frame_27_delay-0.1s.jpg",
+    "frames/frame_28_delay-0.1s.jpg",
+    "frames/frame_29_delay-0.1s.jpg",
+    "frames/frame_30_delay-0.1s.jpg",
+    "frames/frame_31_delay-0.1s.jpg",
+    "frames/frame_32_delay-0.1s.jpg",
+    "frames/frame_33_delay-0.1s.jpg",
+    "frames/frame_34_delay-0.1s.jpg",
+    "frames/frame_35_delay-0.1s.jpg",
+    "frames/frame_36_delay-0.1s.jpg",
+    "frames/frame_37_delay-0.1s.jpg",
+    "frames/frame_38_delay-0.1s.jpg",
+    "frames/frame_39_delay-0.1s.jpg",
+    "frames/frame_40_delay-0.1s.jpg",
+    "frames/frame_41_delay-0.1s.jpg",
+    "frames/frame_42_delay-0.1s.jpg",
+]
+
+profilePicCoords = [
+    {
+        "coords": (162, 65),
+        "size": (64, 64)
+    },
+    {
+        "coords": (155, 50),
+        "size": (64, 64)
+    },
+    {
+        "coords": (100, 10),
+        "size": (64, 64)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (64, 64)
+    },
+    {
+        "coords": (260, 90),
+        "size": (64, 64)
+    },
+    {
+        "coords": (162, 65),
+        "size": (64, 64)
+    },
+    {
+        "coords": (75, 0),
+        "size": (64, 64)
+    },
+    {
+        "coords": (120, 50),
+        "size": (16, 16)
+    },
+    {
+        "coords": (128, 30),
+        "size": (16, 16)
+    },
+    {
+        "coords": (175, 50),
+        "size": (16, 16)
+    },
+    {
+        "coords": (170, 65),
+        "size": (16, 16)
+    },
+    {
+        "coords": (160, 75),
+        "size": (16, 16)
+    },
+    {
+        "coords": (160, 79),
+        "size": (16, 16)
+    },
+    {
+        "coords": (160, 79),
+        "size": (16, 16)
+    },
+    {
+        "coords": (160, 79),
+        "size": (16, 16)
+    },
+    {
+        "coords": (172, 73),
+        "size": (16, 16)
+    },
+    {
+        "coords": (163, 40),
+        "size": (16, 16)
+    },
+    {
+        "coords": (83, 20),
+        "size": (16, 16)
+    },
+    {
+        "coords": (40, 13),
+        "size": (16, 16)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+    {
+        "coords": (-100, -100),
+        "size": (32, 32)
+    },
+]
@@ -0,0 +1,65 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import ImageRenderer
+
+IMAGE_WORKERS = 2
+# Renders allowed to be running or waiting at once before new requests are turned away
+IMAGE_QUEUE_SIZE = 8
+
+
+class ImageQueueFull(Exception):
+    pass
+
+
+# A worker died and took the pool with it. The pool has been replaced, so trying again later will work.
+class ImageWorkersRestarted(ImageQueueFull):
+    pass
+
+
+# Runs the Pillow renders on a dedicated pool of worker processes, off the event loop and the GIL.
+# Requests for an image that is already being rendered share the running job instead of queueing again.
+class ImageWorkerPool:
+    def __init__(self, workers=IMAGE_WORKERS, queue_size=IMAGE_QUEUE_SIZE):
+        self.workers = workers
+        self.executor = self._new_executor()
+        self.queue_size = queue_size
+        self.jobs = {}
+
+    def _new_executor(self):
+        # Workers are started from a clean forkserver process rather than forked from the bot, which already has
+        # motor and aiohttp threads running that a fork could copy mid-lock
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['utils.ImageRenderer'])
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=ImageRenderer.preload)
+
+    # prepare is a coroutine function that does any downloading and returns the callable to run in a worker
+    async def render(self, key, prepare):
+        job = self.jobs.get(key)
+        if job is None:
+            if len(self.jobs) >= self.queue_size:
+                raise ImageQueueFull()
+            job = asyncio.ensure_future(self._render(prepare))
+            self.jobs[key] = job
+            job.add_done_callback(lambda _: self.jobs.pop(key, None))
+
+        # One impatient caller being cancelled shouldn't cancel the render for everyone else
+        return await asyncio.shield(job)
+
+    async def _render(self, prepare):
+        func = await prepare()
+        executor = self.executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func)
+        except BrokenProcessPool:
+            # Every job running at the time fails together, only the first one to get here replaces the pool
+            if self.executor is executor:
+                print('Image worker died, restarting the image workers')
+                self.executor = self._new_executor()
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise ImageWorkersRestarted()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
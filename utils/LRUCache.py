@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+
+
+# Small thread safe least recently used cache, safe to share with executor threads.
+# maxbytes additionally bounds the total length of the cached values, for caches holding bytes.
+class LRUCache:
+    def __init__(self, maxsize=128, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.currbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _weigh(self, value):
+        return len(value) if self.maxbytes is not None else 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.currbytes -= self._weigh(self._data[key])
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self.currbytes += self._weigh(value)
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self.currbytes > self.maxbytes):
+                _, evicted = self._data.popitem(last=False)
+                self.currbytes -= self._weigh(evicted)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data.pop(key)
+            self.currbytes -= self._weigh(value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.currbytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
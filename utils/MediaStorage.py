@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+import os
+import secrets
+import time
+import uuid
+
+import aiohttp
+
+PUBLITIO_API = 'https://api.publit.io/v1'
+# Uploads get longer than the shared session's default, the attachment is copied straight through to Publitio
+UPLOAD_TIMEOUT = aiohttp.ClientTimeout(total=120, connect=10, sock_read=30)
+DELETE_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10)
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 1
+CHUNK_SIZE = 64 * 1024
+
+
+class MediaStorageError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+# Where image command attachments are kept. upload returns a dict with the public 'url' of the file and the
+# backend's 'id' for it, which is what delete takes.
+class MediaStorage(ABC):
+    @abstractmethod
+    async def upload(self, source_url, filename, content_type=None):
+        pass
+
+    @abstractmethod
+    async def delete(self, file_id):
+        pass
+
+
+async def with_retries(description, attempt):
+    # Runs attempt until it succeeds, retrying connection errors, timeouts and server errors with a backoff
+    for attempt_number in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return await attempt()
+        except (aiohttp.ClientError, asyncio.TimeoutError, MediaStorageError) as e:
+            status = getattr(e, 'status', None)
+            # Timeouts stringify to nothing
+            error = str(e) or type(e).__name__
+            retryable = status is None or status >= 500
+            if not retryable or attempt_number == MAX_ATTEMPTS:
+                raise MediaStorageError(f'{description} failed: {error}', status) from e
+            print(f'{description} failed, retrying: {error}')
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS * attempt_number)
+
+
+# Publitio's REST API over the bot's shared aiohttp session. The attachment is streamed from Discord's CDN
+# into the multipart upload, so the image is never held in memory as a whole.
+class PublitioStorage(MediaStorage):
+    def __init__(self, http_client, key, secret):
+        self.http_client = http_client
+        self.key = key
+        self.secret = secret
+
+    def _auth(self):
+        timestamp = str(int(time.time()))
+        nonce = str(secrets.randbelow(90000000) + 10000000)
+        signature = hashlib.sha1((timestamp + nonce + self.secret).encode()).hexdigest()
+        return {'api_key': self.key, 'api_timestamp': timestamp, 'api_nonce': nonce, 'api_signature': signature}
+
+    async def _check(self, response):
+        # Gateways in front of Publitio answer errors with HTML, so only parse the body of a success
+        if not 200 <= response.status < 300:
+            raise MediaStorageError(f'Publitio returned {response.status}: {response.reason}', response.status)
+
+        try:
+            body = await response.json(content_type=None)
+        except ValueError as e:
+            raise MediaStorageError(f'Publitio returned a body that is not JSON: {e}', response.status) from e
+        if not isinstance(body, dict):
+            raise MediaStorageError(f'Publitio returned unexpected JSON: {body!r}', response.status)
+
+        if not body.get('success', False):
+            error = body.get('error', {}).get('message', response.reason)
+            raise MediaStorageError(f'Publitio returned {response.status}: {error}', response.status)
+        return body
+
+    async def upload(self, source_url, filename, content_type=None):
+        session = self.http_client.session
+
+        async def attempt():
+            # A streamed body can't be replayed, so every attempt starts the download again
+            async with session.get(source_url, timeout=UPLOAD_TIMEOUT) as source:
+                source.raise_for_status()
+                form = aiohttp.FormData()
+                form.add_field('file', source.content, filename=filename,
+                               content_type=content_type or source.content_type)
+                # Publitio can answer an error before it has read the whole upload, which leaves the connection
+                # unusable. Uploads are rare enough that not pooling them costs nothing.
+                async with session.post(f'{PUBLITIO_API}/files/create', params=self._auth(), data=form,
+                                        headers={'Connection': 'close'}, timeout=UPLOAD_TIMEOUT) as response:
+                    body = await self._check(response)
+            return {'url': body['url_preview'], 'id': body['id']}
+
+        return await with_retries(f'Uploading {filename}', attempt)
+
+    async def delete(self, file_id):
+        session = self.http_client.session
+
+        async def attempt():
+            async with session.delete(f'{PUBLITIO_API}/files/delete/{file_id}', params=self._auth(),
+                                      timeout=DELETE_TIMEOUT) as response:
+                if response.status == 404:
+                    return
+                await self._check(response)
+
+        await with_retries(f'Deleting {file_id}', attempt)
+
+
+# Keeps uploads in a local directory, for running the bot without a Publitio account
+class LocalStorage(MediaStorage):
+    def __init__(self, http_client, directory, base_url=None):
+        self.http_client = http_client
+        self.directory = os.path.abspath(directory)
+        self.base_url = base_url
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _url(self, file_id):
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{file_id}"
+        return f'file://{os.path.join(self.directory, file_id)}'
+
+    async def upload(self, source_url, filename, content_type=None):
+        file_id = uuid.uuid4().hex + os.path.splitext(filename)[1].lower()
+        path = os.path.join(self.directory, file_id)
+
+        async def attempt():
+            async with self.http_client.session.get(source_url, timeout=UPLOAD_TIMEOUT) as source:
+                source.raise_for_status()
+                file = await asyncio.to_thread(open, path + '.tmp', 'wb')
+                try:
+                    async for chunk in source.content.iter_chunked(CHUNK_SIZE):
+                        await asyncio.to_thread(file.write, chunk)
+                finally:
+                    await asyncio.to_thread(file.close)
+            await asyncio.to_thread(os.replace, path + '.tmp', path)
+            return {'url': self._url(file_id), 'id': file_id}
+
+        return await with_retries(f'Saving {filename}', attempt)
+
+    async def delete(self, file_id):
+        # Ids are generated by upload, never let one point outside the directory
+        path = os.path.join(self.directory, os.path.basename(file_id))
+        try:
+            await asyncio.to_thread(os.remove, path)
+        except FileNotFoundError:
+            pass
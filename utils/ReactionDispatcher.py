@@ -0,0 +1,42 @@
+import asyncio
+
+import discord
+
+# Discord allows at most 20 unique reactions on a single message
+MAX_REACTIONS_PER_MESSAGE = 20
+# Reactions in a channel share one rate limit bucket. discord.py waits on the bucket and retries
+# 429s for us, this just keeps a burst of matches from queueing dozens of requests against it.
+MAX_CONCURRENT_REACTIONS_PER_CHANNEL = 3
+
+
+# Sends the reactions for a message as a background batch so command handling doesn't wait on them
+class ReactionDispatcher:
+    def __init__(self):
+        self.channel_limits = {}
+        self.pending = set()
+
+    def dispatch(self, message, reactions):
+        # Drop duplicates and emojis we couldn't resolve, keeping the trigger order
+        reactions = list(dict.fromkeys(reaction for reaction in reactions if reaction is not None))
+        if not reactions:
+            return
+
+        task = asyncio.create_task(self.add_reactions(message, reactions[:MAX_REACTIONS_PER_MESSAGE]))
+        # Hold a reference until the batch finishes so the task isn't garbage collected
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def add_reactions(self, message, reactions):
+        limit = self.channel_limits.get(message.channel.id)
+        if limit is None:
+            limit = asyncio.Semaphore(MAX_CONCURRENT_REACTIONS_PER_CHANNEL)
+            self.channel_limits[message.channel.id] = limit
+
+        async def add_reaction(reaction):
+            async with limit:
+                try:
+                    await message.add_reaction(reaction)
+                except discord.HTTPException as e:
+                    print(f'Failed to add reaction {reaction} to message {message.id}: {e}')
+
+        await asyncio.gather(*(add_reaction(reaction) for reaction in reactions))
@@ -0,0 +1,79 @@
+import time
+
+from utils.ReactionMatcher import ReactionMatcher
+
+
+# Immutable view of the reaction events at one point in time, along with the automaton built from them
+class ReactionEventSnapshot:
+    __slots__ = ('version', 'events', 'matcher', 'built_at', 'build_seconds')
+
+    def __init__(self, version, events, matcher, build_seconds):
+        self.build_seconds = build_seconds
+        self.built_at = time.time()
+        self.version = version
+        self.events = tuple(events)
+        self.matcher = matcher
+
+
+# Copy-on-write store for reaction events. Every change builds a new snapshot off to the side and
+# swaps it in with a single assignment, so on_message always sees a complete set of events. Single
+# changes are applied to a copy of the current matcher rather than inserting every event again.
+class ReactionEventStore:
+    def __init__(self):
+        self.snapshot = ReactionEventSnapshot(0, (), ReactionMatcher(), 0)
+
+    def _swap(self, events, matcher, start):
+        # Only relinks the automaton if the set of trigger texts changed
+        matcher.compile()
+        self.snapshot = ReactionEventSnapshot(self.snapshot.version + 1, events, matcher,
+                                              time.perf_counter() - start)
+
+    def load(self, events):
+        start = time.perf_counter()
+        events = list(events)
+        self._swap(events, ReactionMatcher(events), start)
+
+    def add(self, event):
+        start = time.perf_counter()
+        matcher = self.snapshot.matcher.copy()
+        matcher.add(event)
+        self._swap([e for e in self.snapshot.events if e.event_id != event.event_id] + [event], matcher, start)
+
+    def update(self, event):
+        start = time.perf_counter()
+        matcher = self.snapshot.matcher.copy()
+        # add replaces the event's old trigger text
+        matcher.add(event)
+        self._swap([event if e.event_id == event.event_id else e for e in self.snapshot.events], matcher, start)
+
+    def remove(self, event_id):
+        removed = self.get(event_id)
+        if removed is not None:
+            start = time.perf_counter()
+            matcher = self.snapshot.matcher.copy()
+            matcher.remove(event_id)
+            self._swap([e for e in self.snapshot.events if e.event_id != event_id], matcher, start)
+        return removed
+
+    def get(self, event_id):
+        for event in self.snapshot.events:
+            if event.event_id == event_id:
+                return event
+        return None
+
+    def search(self, text):
+        return self.snapshot.matcher.search(text)
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    @property
+    def last_rebuild_seconds(self):
+        return self.snapshot.build_seconds
+
+    def __len__(self):
+        return len(self.snapshot.events)
+
+    def __iter__(self):
+        return iter(self.snapshot.events)
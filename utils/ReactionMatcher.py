@@ -0,0 +1,135 @@
+from collections import deque
+
+
+# Aho-Corasick automaton over the reaction event trigger texts. Finds every event whose text
+# appears in a message with a single pass over the message, regardless of how many events exist.
+class ReactionMatcher:
+    def __init__(self, events=()):
+        # Trie nodes, node 0 is the root
+        self._children = [{}]
+        self._pattern = [None]
+        self._fail = [0]
+        self._output = [-1]
+        # pattern -> {event_id: event}, in insertion order
+        self._events = {}
+        self._event_patterns = {}
+        self._dirty = False
+
+        for event in events:
+            self.add(event)
+
+    def add(self, event):
+        if event.event_id in self._event_patterns:
+            self.remove(event.event_id)
+
+        pattern = event.text
+        if pattern not in self._events:
+            node = 0
+            for character in pattern:
+                child = self._children[node].get(character)
+                if child is None:
+                    child = len(self._children)
+                    self._children.append({})
+                    self._pattern.append(None)
+                    self._fail.append(0)
+                    self._output.append(-1)
+                    self._children[node][character] = child
+                node = child
+            self._pattern[node] = pattern
+            self._events[pattern] = {}
+            self._dirty = True
+
+        self._events[pattern][event.event_id] = event
+        self._event_patterns[event.event_id] = pattern
+
+    def remove(self, event_id):
+        pattern = self._event_patterns.pop(event_id, None)
+        if pattern is None:
+            return None
+
+        events = self._events[pattern]
+        event = events.pop(event_id)
+        if not events:
+            # Leave the trie nodes in place, just stop reporting the pattern
+            del self._events[pattern]
+            self._pattern[self._find_node(pattern)] = None
+            self._dirty = True
+        return event
+
+    # Independent copy to change without touching this one, which may still be searched by on_message
+    def copy(self):
+        clone = ReactionMatcher()
+        clone._children = [dict(children) for children in self._children]
+        clone._pattern = list(self._pattern)
+        clone._fail = list(self._fail)
+        clone._output = list(self._output)
+        clone._events = {pattern: dict(events) for pattern, events in self._events.items()}
+        clone._event_patterns = dict(self._event_patterns)
+        clone._dirty = self._dirty
+        return clone
+
+    def _find_node(self, pattern):
+        node = 0
+        for character in pattern:
+            node = self._children[node][character]
+        return node
+
+    def compile(self):
+        if self._dirty:
+            self._build_links()
+
+    def _build_links(self):
+        # Breadth first so every node's failure link points at an already finished node
+        self._fail[0] = 0
+        self._output[0] = -1
+        queue = deque()
+        for child in self._children[0].values():
+            self._fail[child] = 0
+            self._output[child] = -1
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for character, child in self._children[node].items():
+                fail = self._fail[node]
+                while fail and character not in self._children[fail]:
+                    fail = self._fail[fail]
+                fail = self._children[fail].get(character, 0)
+                self._fail[child] = fail
+                # Closest node down the failure chain that ends a pattern
+                self._output[child] = fail if self._pattern[fail] is not None else self._output[fail]
+                queue.append(child)
+
+        self._dirty = False
+
+    def search(self, text):
+        self.compile()
+
+        children = self._children
+        fail = self._fail
+        matched = []
+        seen = set()
+
+        # An empty trigger text is contained in every message
+        if self._pattern[0] is not None:
+            matched.append(self._pattern[0])
+            seen.add(self._pattern[0])
+
+        node = 0
+        for character in text:
+            while node and character not in children[node]:
+                node = fail[node]
+            node = children[node].get(character, 0)
+
+            match = node if self._pattern[node] is not None else self._output[node]
+            while match > 0:
+                pattern = self._pattern[match]
+                if pattern not in seen:
+                    seen.add(pattern)
+                    matched.append(pattern)
+                match = self._output[match]
+
+        return [event for pattern in matched for event in self._events[pattern].values()]
+
+    def __len__(self):
+        return len(self._event_patterns)
@@ -0,0 +1,108 @@
+import asyncio
+import copy
+
+WRITE_DELAY_SECONDS = 5
+
+
+# Queues $set/$unset changes to a single Mongo document in memory and writes them out together after a
+# short delay, so a burst of changes costs one update_one. Changes to a field and its subfields are merged
+# so the combined update never has conflicting paths.
+class WriteBehindDocument:
+    def __init__(self, collection, document_id, delay=WRITE_DELAY_SECONDS):
+        self.collection = collection
+        self.document_id = document_id
+        self.delay = delay
+        self.pending_set = {}
+        self.pending_unset = set()
+        self.flush_task = None
+
+    async def load(self):
+        return await self.collection.find_one({"_id": self.document_id})
+
+    def _pending_parent(self, path):
+        parts = path.split('.')
+        for i in range(1, len(parts)):
+            parent = '.'.join(parts[:i])
+            if parent in self.pending_set:
+                return parent, parts[i:]
+        return None, None
+
+    def _drop_pending_children(self, path):
+        prefix = path + '.'
+        for key in [key for key in self.pending_set if key.startswith(prefix)]:
+            del self.pending_set[key]
+        self.pending_unset = {key for key in self.pending_unset if not key.startswith(prefix)}
+
+    def set(self, fields):
+        for path, value in fields.items():
+            value = copy.deepcopy(value)
+            self._drop_pending_children(path)
+            self.pending_unset.discard(path)
+
+            parent, rest = self._pending_parent(path)
+            if parent is None:
+                self.pending_set[path] = value
+            else:
+                # The whole parent is already being replaced, fold this change into it
+                target = self.pending_set[parent]
+                for key in rest[:-1]:
+                    target = target.setdefault(key, {})
+                target[rest[-1]] = value
+
+        self._schedule()
+
+    def unset(self, paths):
+        for path in paths:
+            self._drop_pending_children(path)
+            self.pending_set.pop(path, None)
+
+            parent, rest = self._pending_parent(path)
+            if parent is None:
+                self.pending_unset.add(path)
+            else:
+                target = self.pending_set[parent]
+                for key in rest[:-1]:
+                    target = target.get(key, {})
+                target.pop(rest[-1], None)
+
+        self._schedule()
+
+    def _schedule(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        # Changes made while this write is in flight need a write of their own
+        self.flush_task = None
+        await self.flush()
+
+    async def close(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        if not self.pending_set and not self.pending_unset:
+            return
+
+        update = {}
+        if self.pending_set:
+            update["$set"] = self.pending_set
+        if self.pending_unset:
+            update["$unset"] = {path: "" for path in self.pending_unset}
+        self.pending_set = {}
+        self.pending_unset = set()
+
+        try:
+            await self.collection.update_one({"_id": self.document_id}, update, upsert=True)
+        except Exception as e:
+            print(f'Failed to write {self.document_id}, retrying: {e}')
+            # Put the failed changes back underneath anything queued since, then try again later
+            newer_set, newer_unset = self.pending_set, self.pending_unset
+            self.pending_set, self.pending_unset = {}, set()
+            self.set(update.get("$set", {}))
+            self.unset(update.get("$unset", {}))
+            self.set(newer_set)
+            self.unset(newer_unset)